@@ -0,0 +1,93 @@
+"""Archivage des incidents terminés depuis longtemps.
+
+Déplace par lots, de la table `incidents` vers `incidents_archive`, les
+incidents au statut "Terminé" non modifiés depuis ARCHIVE_AFTER_DAYS
+jours : les tableaux de bord ne travaillent plus que sur les incidents
+actifs ou récemment clos. Chaque lot (copie + suppression) est une
+transaction : une interruption ne laisse aucun incident en double ni
+perdu, et relancer le script reprend là où il s'était arrêté. Entre deux
+lots, le job se met en pause pour laisser la base aux requêtes des
+utilisateurs. Les compteurs (counters.py) ne changent pas : un incident
+archivé reste compté dans les statistiques.
+
+À planifier, par exemple chaque nuit via cron :
+    python archive.py --days 90 --batch 1000
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, literal, select
+import models
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "1000"))
+# Pause minimale entre deux lots, et part maximale du temps passée à archiver
+ARCHIVE_PAUSE = float(os.environ.get("ARCHIVE_PAUSE", "0.2"))
+ARCHIVE_DUTY_CYCLE = float(os.environ.get("ARCHIVE_DUTY_CYCLE", "0.5"))
+
+# Colonnes copiées telles quelles (même identifiant)
+ARCHIVED_COLUMNS = (
+    "id", "type_inc", "salle", "description", "image_path", "statut",
+    "date_creation", "date_modification", "prof_id", "departement_id", "commentaire_chef",
+)
+
+def archive_batch(conn, cutoff: datetime, batch_size: int) -> int:
+    """Archive au plus `batch_size` incidents terminés avant `cutoff` ; retourne leur nombre"""
+    incidents = models.Incident.__table__
+    # Verrouiller les lignes choisies : un chef ne peut pas rouvrir un incident pendant son déplacement
+    ids = conn.execute(
+        select(incidents.c.id)
+        .where(incidents.c.statut == "Terminé", incidents.c.date_modification < cutoff)
+        .order_by(incidents.c.date_modification, incidents.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    columns = [incidents.c[name] for name in ARCHIVED_COLUMNS]
+    conn.execute(insert(models.IncidentArchive).from_select(
+        list(ARCHIVED_COLUMNS) + ["date_archivage"],
+        select(*columns, literal(datetime.utcnow(), models.IncidentArchive.date_archivage.type))
+        .where(incidents.c.id.in_(ids))
+    ))
+    conn.execute(delete(incidents).where(incidents.c.id.in_(ids)))
+    return len(ids)
+
+def run(engine, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+        pause: float = ARCHIVE_PAUSE, duty_cycle: float = ARCHIVE_DUTY_CYCLE, max_batches: int = None) -> dict:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    batches = 0
+    start = time.perf_counter()
+    while max_batches is None or batches < max_batches:
+        batch_start = time.perf_counter()
+        with engine.begin() as conn:
+            moved = archive_batch(conn, cutoff, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+        # Au plus `duty_cycle` du temps occupé par l'archivage : un lot lent allonge la pause suivante
+        elapsed = time.perf_counter() - batch_start
+        time.sleep(max(pause, elapsed * (1 - duty_cycle) / duty_cycle))
+    return {
+        "cutoff": cutoff.isoformat(),
+        "archived": archived,
+        "batches": batches,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive les incidents terminés depuis longtemps")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="ancienneté minimale (jours depuis la dernière modification)")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=ARCHIVE_PAUSE, help="pause minimale entre deux lots (secondes)")
+    parser.add_argument("--duty-cycle", type=float, default=ARCHIVE_DUTY_CYCLE)
+    parser.add_argument("--max-batches", type=int, help="s'arrêter après ce nombre de lots (reprise au prochain lancement)")
+    args = parser.parse_args()
+
+    import database
+    print(json.dumps(run(database.engine, args.days, args.batch, args.pause, args.duty_cycle, args.max_batches), indent=2))
@@ -1,9 +1,21 @@
+import asyncio
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
 import bcrypt
 
-def get_password_hash(password: str):
+# Facteur de coût bcrypt ; les hash existants sont mis à niveau à la prochaine connexion
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Taille du pool de hachage et nombre maximal de calculs en attente (contre-pression)
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.environ.get("HASH_QUEUE_SIZE", str(HASH_WORKERS * 4)))
+HASH_QUEUE_TIMEOUT = float(os.environ.get("HASH_QUEUE_TIMEOUT", "5"))
+
+def get_password_hash(password: str, rounds: int = None):
     """Hash un mot de passe avec bcrypt"""
     pwd_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(pwd_bytes, salt)
     # Retourner en string UTF-8
     return hashed_password.decode('utf-8')
@@ -16,4 +28,74 @@ def verify_password(plain_password: str, hashed_password: str):
         return bcrypt.checkpw(password_byte, hashed_byte)
     except Exception as e:
         print(f"Erreur de vérification: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Indique si le hash a été calculé avec un autre coût que BCRYPT_ROUNDS"""
+    try:
+        # Format : $2b$<coût>$<sel+hash>
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+class HashingPoolBusy(Exception):
+    """Levée quand la file du pool de hachage reste pleine trop longtemps"""
+
+class HashingPool:
+    """Pool de processus dédié à bcrypt, pour ne bloquer ni la boucle asyncio ni le threadpool.
+
+    Au plus `queue_size` calculs peuvent être soumis en même temps ; au-delà,
+    les appelants attendent une place pendant `timeout` secondes puis
+    reçoivent HashingPoolBusy.
+    """
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE,
+                 timeout: float = HASH_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+    async def run(self, func, *args):
+        self._ensure_started()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise HashingPoolBusy("Trop de calculs de mot de passe en attente")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._slots = None
+
+hashing_pool = HashingPool()
+
+async def get_password_hash_async(password: str):
+    """Comme get_password_hash, exécuté dans le pool de hachage"""
+    return await hashing_pool.run(get_password_hash, password, BCRYPT_ROUNDS)
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    """Comme verify_password, exécuté dans le pool de hachage"""
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+# Hash factice calculé une fois, au premier besoin (jamais au démarrage)
+_dummy_hash = None
+
+async def verify_dummy_async(plain_password: str) -> bool:
+    """Vérification contre un hash factice pour un utilisateur inconnu : même durée, toujours False"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash_async(secrets.token_urlsafe(16))
+    await verify_password_async(plain_password, _dummy_hash)
+    return False
@@ -0,0 +1,66 @@
+"""Benchmark du débit de vérification des mots de passe à la connexion.
+
+Compare, pour plusieurs niveaux de concurrence, la vérification bcrypt
+exécutée directement sur la boucle asyncio (ancien comportement de
+`register`) et celle déléguée au pool de hachage de auth.py. Mesure aussi
+le retard maximal de la boucle, c'est-à-dire le temps pendant lequel les
+autres requêtes restent bloquées.
+
+Usage : python bench_login.py [nombre_de_connexions] [concurrence ...]
+"""
+import asyncio
+import json
+import sys
+import time
+import auth
+
+async def _loop_lag_probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - start - 0.005)
+
+async def run(mode: str, total: int, concurrency: int, hashed: str):
+    stop = asyncio.Event()
+    lags = []
+    probe = asyncio.create_task(_loop_lag_probe(stop, lags))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with slots:
+            if mode == "pool":
+                ok = await auth.verify_password_async("123", hashed)
+            else:
+                ok = auth.verify_password("123", hashed)
+                await asyncio.sleep(0)
+            assert ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "logins": total,
+        "seconds": round(elapsed, 3),
+        "logins_per_second": round(total / elapsed, 1),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 1),
+    }
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    levels = [int(c) for c in sys.argv[2:]] or [1, 8, 32]
+    hashed = auth.get_password_hash("123")
+    # Démarrer les processus du pool avant de mesurer
+    await auth.verify_password_async("123", hashed)
+    results = []
+    for concurrency in levels:
+        for mode in ("inline", "pool"):
+            results.append(await run(mode, total, concurrency, hashed))
+    auth.hashing_pool.shutdown()
+    print(json.dumps({"bcrypt_rounds": auth.BCRYPT_ROUNDS, "workers": auth.HASH_WORKERS, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,194 @@
+"""Benchmark de charge des routes principales, sans interaction.
+
+Envoie des requêtes concurrentes à l'application via un client ASGI en
+mémoire, sur une base préparée avec seed_data.py, et produit un rapport
+JSON (débit et latences p50/p95/p99 par route). Avec --baseline, compare
+le p95 de chaque route à un rapport précédent et sort en erreur si l'une
+d'elles régresse au-delà du seuil.
+
+Usage :
+    python seed_data.py --url sqlite:///bench.db --incidents 1000000
+    python bench_routes.py --url sqlite:///bench.db --requests 500 --concurrency 32 --output run.json
+    python bench_routes.py --url sqlite:///bench.db --baseline run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    """Débit et quantiles de latence (en millisecondes) d'une série de requêtes"""
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(quantiles[49] * 1000, 2) if latencies else 0.0,
+        "p95_ms": round(quantiles[94] * 1000, 2) if latencies else 0.0,
+        "p99_ms": round(quantiles[98] * 1000, 2) if latencies else 0.0,
+    }
+
+async def measure(total: int, concurrency: int, make_request, expected_status: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != expected_status:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+async def run(args) -> dict:
+    import httpx
+    from sqlalchemy import select
+    import database
+    import main
+    import models
+
+    with database.SessionLocal() as db:
+        profs = db.execute(
+            select(models.User.username, models.User.departement_id).where(models.User.role == "professeur").limit(args.users)
+        ).all()
+        chefs = db.execute(
+            select(models.User.username, models.User.chef_departement_id).where(models.User.role == "chef").limit(args.users)
+        ).all()
+        incident_ids = {}
+        for _, dept_id in chefs:
+            incident_ids[dept_id] = db.execute(
+                select(models.Incident.id).where(models.Incident.departement_id == dept_id).limit(1000)
+            ).scalars().all()
+        incident_count = db.query(models.Incident).count()
+
+    await main.app.router.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    rng = random.Random(args.seed)
+
+    async def logged_in(username: str):
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+        response = await client.post("/login", data={"username": username, "password": args.password})
+        user_id = int(response.headers["location"].rsplit("/", 1)[1])
+        return client, user_id
+
+    prof_clients = [await logged_in(username) for username, _ in profs]
+    chef_clients = [(await logged_in(username), dept_id) for username, dept_id in chefs]
+    anonymous = httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+    def login(i):
+        username = profs[i % len(profs)][0]
+        return anonymous.post("/login", data={"username": username, "password": args.password})
+
+    def prof_dashboard(i):
+        client, user_id = prof_clients[i % len(prof_clients)]
+        return client.get(f"/prof/{user_id}")
+
+    def admin_dashboard(i):
+        (client, user_id), _ = chef_clients[i % len(chef_clients)]
+        return client.get(f"/admin/{user_id}")
+
+    def add_incident(i):
+        client, user_id = prof_clients[i % len(prof_clients)]
+        return client.post(f"/prof/signaler/{user_id}", data={
+            "type_inc": "Vidéoprojecteur", "salle": f"B{i % 40}", "desc": "Benchmark"
+        })
+
+    def update_status(i):
+        (client, user_id), dept_id = chef_clients[i % len(chef_clients)]
+        inc_id = rng.choice(incident_ids[dept_id])
+        return client.post(f"/admin/update/{inc_id}", data={
+            "new_status": rng.choice(("En attente", "En cours", "Terminé")), "admin_id": user_id
+        })
+
+    scenarios = {
+        "POST /login": (login, 303),
+        "GET /prof/{id}": (prof_dashboard, 200),
+        "GET /admin/{id}": (admin_dashboard, 200),
+        "POST /prof/signaler/{id}": (add_incident, 303),
+        "POST /admin/update/{id}": (update_status, 303),
+    }
+    routes = {}
+    for name, (make_request, expected_status) in scenarios.items():
+        if args.only and args.only not in name:
+            continue
+        routes[name] = await measure(args.requests, args.concurrency, make_request, expected_status)
+
+    for client, _ in prof_clients:
+        await client.aclose()
+    for (client, _), _ in chef_clients:
+        await client.aclose()
+    await anonymous.aclose()
+    await main.app.router.shutdown()
+
+    return {
+        "meta": {
+            "url": args.url,
+            "incidents": incident_count,
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "python": sys.version.split()[0],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "routes": routes,
+    }
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Routes dont le p95 dépasse celui de la référence de plus de `threshold` (ex: 0.2 = +20 %)"""
+    regressions = []
+    for name, current in report["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous or not previous["p95_ms"]:
+            continue
+        ratio = current["p95_ms"] / previous["p95_ms"]
+        current["p95_vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des routes de l'application")
+    parser.add_argument("--url", default="sqlite:///bench.db", help="base préparée avec seed_data.py")
+    parser.add_argument("--requests", type=int, default=200, help="requêtes par route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=10, help="sessions ouvertes par rôle")
+    parser.add_argument("--password", default="123")
+    parser.add_argument("--only", help="ne mesurer que les routes contenant ce texte")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier où écrire le rapport JSON")
+    parser.add_argument("--baseline", help="rapport JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Configuration de l'application avant son import
+    os.environ["DATABASE_URL"] = args.url
+    os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="bench_uploads_"))
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    # Toutes les connexions viennent de la même adresse : le limiteur fausserait la mesure
+    os.environ.setdefault("LOGIN_THROTTLE_ENABLED", "0")
+
+    report = asyncio.run(run(args))
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,81 @@
+"""Benchmark d'ingestion des signalements avec photo.
+
+Lance l'application sur une base SQLite et un dossier d'uploads
+temporaires, puis envoie de nombreux `POST /prof/signaler/{user_id}`
+concurrents, chacun avec une image, via un client ASGI en mémoire.
+
+Usage : python bench_upload.py [nombre_de_requetes] [concurrence] [taille_image_ko]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_upload_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{WORK_DIR}/bench.db")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(WORK_DIR, "uploads"))
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+import manage
+
+# L'application ne crée plus le schéma ni les comptes de démonstration au démarrage
+manage.migrate()
+manage.seed_demo()
+import main
+
+def make_image(size_kb: int) -> bytes:
+    """Fichier commençant par la signature PNG, complété d'octets aléatoires"""
+    return b"\x89PNG\r\n\x1a\n" + os.urandom(size_kb * 1024)
+
+async def run(total: int, concurrency: int, size_kb: int):
+    await main.app.router.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/login", data={"username": "prof1", "password": "123"})
+        user_id = int(response.headers["location"].rsplit("/", 1)[1])
+        image = make_image(size_kb)
+        slots = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one_upload(i: int):
+            nonlocal errors
+            async with slots:
+                start = time.perf_counter()
+                response = await client.post(
+                    f"/prof/signaler/{user_id}",
+                    data={"type_inc": "Vidéoprojecteur", "salle": f"B{i % 40}", "desc": "Benchmark"},
+                    files={"image": ("photo.png", image, "image/png")},
+                )
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 303:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_upload(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    await main.app.router.shutdown()
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "image_kb": size_kb,
+        "errors": errors,
+        "requests_per_second": round(total / elapsed, 1),
+        "megabytes_per_second": round(total * size_kb / 1024 / elapsed, 2),
+        "p50_ms": round(quantiles[49] * 1000, 1),
+        "p95_ms": round(quantiles[94] * 1000, 1),
+        "p99_ms": round(quantiles[98] * 1000, 1),
+    }
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    size_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 1024
+    print(json.dumps(asyncio.run(run(total, concurrency, size_kb)), indent=2))
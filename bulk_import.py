@@ -0,0 +1,319 @@
+"""Import en masse d'utilisateurs et d'incidents depuis un fichier CSV.
+
+Le fichier est lu en flux et traité par lots de IMPORT_CHUNK_SIZE lignes :
+- les codes de département (Departement.code) sont résolus par un cache
+  chargé une fois ;
+- l'unicité des noms d'utilisateur et e-mails est vérifiée en une requête
+  par lot (et dans le fichier lui-même) ;
+- les longueurs sont vérifiées ligne par ligne (colonnes du modèle) ;
+- les mots de passe sont hachés en parallèle dans un pool de processus
+  partagé par tous les imports, au plus IMPORT_MAX_CONCURRENT à la fois ;
+- chaque lot est inséré par executemany dans sa propre transaction ; si
+  la base refuse le lot (doublon concurrent...), ses lignes sont reprises
+  une à une et seules les fautives sont rejetées.
+
+L'import est un générateur d'événements : une erreur par ligne rejetée,
+un point d'avancement par lot, puis un résumé. Utilisé par
+`python manage.py import` et par la route POST /admin/import/{user_id}.
+
+Colonnes attendues :
+    utilisateurs : username, password, role, nom_complet, email, departement
+    incidents    : prof, type_inc, salle, description [, statut, date_creation,
+                   date_modification, commentaire_chef, departement]
+"""
+import csv
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import DataError, IntegrityError
+import auth
+import counters
+import models
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+# Processus de hachage réservés à l'import (la moitié des cœurs : les connexions continuent)
+IMPORT_HASH_WORKERS = int(os.environ.get("IMPORT_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+IMPORT_MAX_CONCURRENT = int(os.environ.get("IMPORT_MAX_CONCURRENT", "2"))
+
+KINDS = ("utilisateurs", "incidents")
+ROLES = ("professeur", "chef")
+USER_COLUMNS = ("username", "password", "role", "nom_complet", "email", "departement")
+INCIDENT_COLUMNS = ("prof", "type_inc", "salle", "description")
+
+# Imports en cours (route et ligne de commande) et pool de hachage commun, créé au premier import
+import_slots = threading.BoundedSemaphore(IMPORT_MAX_CONCURRENT)
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+def hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ProcessPoolExecutor(max_workers=IMPORT_HASH_WORKERS)
+        return _hash_executor
+
+def shutdown():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=True)
+            _hash_executor = None
+
+def _too_long(values: dict, model) -> list:
+    """Champs dont la valeur dépasse la longueur de la colonne du modèle"""
+    columns = model.__table__.c
+    return [
+        key for key, value in values.items()
+        if key in columns and getattr(columns[key].type, "length", None) and len(value) > columns[key].type.length
+    ]
+
+def _chunks(reader, size):
+    # Numéro de ligne du fichier (l'en-tête est la ligne 1)
+    chunk = []
+    for line, row in enumerate(reader, start=2):
+        chunk.append((line, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _value(row, key) -> str:
+    return (row.get(key) or "").strip()
+
+def _parse_date(value: str, default: datetime) -> datetime:
+    return datetime.fromisoformat(value) if value else default
+
+def _error(line: int, message: str) -> dict:
+    return {"type": "erreur", "ligne": line, "erreur": message}
+
+class Importer:
+    """Import d'un fichier ; `departement_id` restreint toutes les lignes à un département (import par un chef)"""
+    def __init__(self, engine, departement_id: int = None, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.engine = engine
+        self.departement_id = departement_id
+        self.chunk_size = chunk_size
+        self.stats = Counter()
+        with engine.connect() as conn:
+            # Tables de référence petites : chargées une fois pour tout le fichier
+            self.departements = dict(conn.execute(select(models.Departement.code, models.Departement.id)).all())
+            self.departements_with_chef = set(conn.execute(
+                select(models.User.chef_departement_id).where(models.User.role == "chef")
+            ).scalars())
+        self.profs = {}
+
+    def _departement(self, code: str):
+        """Retourne (departement_id, erreur)"""
+        if not code:
+            if self.departement_id is not None:
+                return self.departement_id, None
+            return None, "département manquant"
+        departement_id = self.departements.get(code)
+        if departement_id is None:
+            return None, f"département inconnu : {code}"
+        if self.departement_id is not None and departement_id != self.departement_id:
+            return None, "département hors de votre périmètre"
+        return departement_id, None
+
+    def run(self, text_stream, kind: str):
+        """Générateur d'événements (erreurs, avancement, résumé) de l'import de `text_stream`"""
+        reader = csv.DictReader(text_stream)
+        expected = USER_COLUMNS if kind == "utilisateurs" else INCIDENT_COLUMNS
+        missing = [column for column in expected if column not in (reader.fieldnames or ())]
+        if missing:
+            yield {"type": "fin", "erreur": f"colonnes manquantes : {', '.join(missing)}", **self.stats}
+            return
+
+        if not import_slots.acquire(blocking=False):
+            yield {"type": "fin", "erreur": "trop d'imports en cours, réessayez plus tard", **self.stats}
+            return
+        start = time.perf_counter()
+        seen = set()
+        try:
+            for chunk in _chunks(reader, self.chunk_size):
+                inserted_before = self.stats["inserees"]
+                if kind == "utilisateurs":
+                    yield from self._import_users(chunk, seen)
+                else:
+                    yield from self._import_incidents(chunk)
+                self.stats["lignes"] += len(chunk)
+                self.stats["rejetees"] += len(chunk) - (self.stats["inserees"] - inserted_before)
+                yield {"type": "avancement", **self.stats, "secondes": round(time.perf_counter() - start, 3)}
+        finally:
+            import_slots.release()
+        yield {"type": "fin", **self.stats, "secondes": round(time.perf_counter() - start, 3)}
+
+    def _insert(self, rows, lines, write):
+        """Insère les lignes d'un lot avec `write(conn, rows)` ; en cas de refus, les reprend une à une"""
+        try:
+            with self.engine.begin() as conn:
+                write(conn, rows)
+            self.stats["inserees"] += len(rows)
+            return
+        except (IntegrityError, DataError):
+            pass
+        for line, row in zip(lines, rows):
+            try:
+                with self.engine.begin() as conn:
+                    write(conn, [row])
+                self.stats["inserees"] += 1
+            except IntegrityError:
+                yield _error(line, "refusée par la base (doublon ou référence invalide)")
+            except DataError:
+                yield _error(line, "valeur refusée par la base")
+
+    def _import_users(self, chunk, seen):
+        candidates = []
+        for line, row in chunk:
+            values = {key: _value(row, key) for key in USER_COLUMNS}
+            missing = [key for key in USER_COLUMNS if key != "departement" and not values[key]]
+            if missing:
+                yield _error(line, f"champ(s) vide(s) : {', '.join(missing)}")
+                continue
+            too_long = _too_long(values, models.User)
+            if too_long:
+                yield _error(line, f"champ(s) trop long(s) : {', '.join(too_long)}")
+                continue
+            if values["role"] not in ROLES:
+                yield _error(line, f"rôle inconnu : {values['role']}")
+                continue
+            if self.departement_id is not None and values["role"] != "professeur":
+                yield _error(line, "seuls des professeurs peuvent être importés depuis l'espace chef")
+                continue
+            departement_id, error = self._departement(values["departement"])
+            if error:
+                yield _error(line, error)
+                continue
+            keys = ("username:" + values["username"], "email:" + values["email"].lower())
+            if keys[0] in seen or keys[1] in seen:
+                yield _error(line, "doublon dans le fichier")
+                continue
+            seen.update(keys)
+            candidates.append((line, values, departement_id))
+
+        if not candidates:
+            return
+        # Unicité : une seule requête pour tout le lot
+        usernames = [values["username"] for _, values, _ in candidates]
+        emails = [values["email"] for _, values, _ in candidates]
+        with self.engine.connect() as conn:
+            existing = conn.execute(
+                select(models.User.username, models.User.email)
+                .where(or_(models.User.username.in_(usernames), models.User.email.in_(emails)))
+            ).all()
+        taken_usernames = {username for username, _ in existing}
+        taken_emails = {(email or "").lower() for _, email in existing}
+
+        accepted = []
+        lines = []
+        for line, values, departement_id in candidates:
+            if values["username"] in taken_usernames or values["email"].lower() in taken_emails:
+                yield _error(line, "nom d'utilisateur ou e-mail déjà utilisé")
+                continue
+            if values["role"] == "chef":
+                if departement_id in self.departements_with_chef:
+                    yield _error(line, "ce département a déjà un chef")
+                    continue
+                self.departements_with_chef.add(departement_id)
+            accepted.append((values, departement_id))
+            lines.append(line)
+
+        if not accepted:
+            return
+        # Hachage bcrypt réparti sur les processus (le coût dominant de l'import)
+        passwords = [values["password"] for values, _ in accepted]
+        hashes = list(hash_executor().map(
+            auth.get_password_hash, passwords, chunksize=max(1, len(passwords) // (IMPORT_HASH_WORKERS * 4))
+        ))
+        rows = [{
+            "username": values["username"],
+            "hashed_password": hashed,
+            "role": values["role"],
+            "nom_complet": values["nom_complet"],
+            "email": values["email"],
+            # Mêmes clés dans chaque ligne : executemany exige des paramètres homogènes
+            "departement_id": departement_id if values["role"] == "professeur" else None,
+            "chef_departement_id": departement_id if values["role"] == "chef" else None,
+        } for (values, departement_id), hashed in zip(accepted, hashes)]
+        yield from self._insert(rows, lines, lambda conn, batch: conn.execute(insert(models.User), batch))
+
+    def _resolve_profs(self, usernames):
+        unknown = [username for username in usernames if username not in self.profs]
+        if not unknown:
+            return
+        with self.engine.connect() as conn:
+            for user_id, username, departement_id in conn.execute(
+                select(models.User.id, models.User.username, models.User.departement_id)
+                .where(models.User.username.in_(unknown), models.User.role.in_(("professeur", "prof")))
+            ):
+                self.profs[username] = (user_id, departement_id)
+        for username in unknown:
+            self.profs.setdefault(username, None)
+
+    def _import_incidents(self, chunk):
+        self._resolve_profs({_value(row, "prof") for _, row in chunk})
+        now = datetime.utcnow()
+        rows = []
+        lines = []
+        for line, row in chunk:
+            values = {key: _value(row, key) for key in INCIDENT_COLUMNS}
+            missing = [key for key in INCIDENT_COLUMNS if not values[key]]
+            if missing:
+                yield _error(line, f"champ(s) vide(s) : {', '.join(missing)}")
+                continue
+            # La description est tronquée (comme le formulaire), les autres champs sont vérifiés
+            too_long = _too_long(
+                {"type_inc": values["type_inc"], "salle": values["salle"], "commentaire_chef": _value(row, "commentaire_chef")},
+                models.Incident
+            )
+            if too_long:
+                yield _error(line, f"champ(s) trop long(s) : {', '.join(too_long)}")
+                continue
+            prof = self.profs.get(values["prof"])
+            if prof is None:
+                yield _error(line, f"professeur inconnu : {values['prof']}")
+                continue
+            prof_id, prof_departement_id = prof
+            if _value(row, "departement"):
+                departement_id, error = self._departement(_value(row, "departement"))
+            elif self.departement_id is not None and prof_departement_id != self.departement_id:
+                departement_id, error = None, "département hors de votre périmètre"
+            else:
+                departement_id, error = prof_departement_id, None if prof_departement_id else "professeur sans département"
+            if error:
+                yield _error(line, error)
+                continue
+            statut = _value(row, "statut") or "En attente"
+            if statut not in counters.STATUTS:
+                yield _error(line, f"statut inconnu : {statut}")
+                continue
+            try:
+                date_creation = _parse_date(_value(row, "date_creation"), now)
+                date_modification = _parse_date(_value(row, "date_modification"), date_creation)
+            except ValueError:
+                yield _error(line, "date invalide (format attendu : AAAA-MM-JJ[THH:MM:SS])")
+                continue
+            rows.append({
+                "type_inc": values["type_inc"],
+                "salle": values["salle"],
+                "description": values["description"][:500],
+                "statut": statut,
+                "date_creation": date_creation,
+                "date_modification": date_modification,
+                "prof_id": prof_id,
+                "departement_id": departement_id,
+                "commentaire_chef": _value(row, "commentaire_chef") or None,
+            })
+            lines.append(line)
+
+        def write(conn, batch):
+            # Incidents et compteurs dans la même transaction, comme les routes
+            conn.execute(insert(models.Incident), batch)
+            counters.apply_deltas(conn, Counter((r["departement_id"], r["statut"], r["type_inc"]) for r in batch))
+
+        if rows:
+            yield from self._insert(rows, lines, write)
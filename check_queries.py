@@ -0,0 +1,87 @@
+"""Vérifie le nombre de requêtes SQL des tableaux de bord.
+
+Sur une SQLite temporaire migrée et remplie de 60 incidents actifs et 60
+archivés, chaque page est demandée avec limit=1 puis limit=50 : le nombre
+de requêtes doit être identique (pas de requête par ligne) et ne pas
+dépasser le budget déclaré ci-dessous. Sort en erreur (code 1) sinon.
+
+Usage :
+    python check_queries.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Requêtes SQL autorisées par page, quel que soit le nombre de lignes affichées
+QUERY_BUDGETS = {
+    "/prof/{id}": 1,
+    "/prof/{id}?vue=historique": 1,
+    "/admin/{id}": 2,
+    "/admin/{id}?vue=historique": 2,
+}
+INCIDENTS = 60
+
+def check() -> dict:
+    workdir = tempfile.mkdtemp(prefix="check_queries_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'queries.db')}")
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.setdefault("JOBS_WORKER_IN_APP", "false")
+    here = os.path.dirname(os.path.abspath(__file__))
+    for command in (["migrate"], ["seed-demo"]):
+        subprocess.run([sys.executable, "manage.py", *command], check=True, capture_output=True, cwd=here)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert, select
+    import database
+    import main
+    import models
+    from query_guard import count_queries
+
+    with database.engine.begin() as conn:
+        prof_id, departement_id = conn.execute(
+            select(models.User.id, models.User.departement_id).where(models.User.username == "prof1")
+        ).one()
+        now = datetime.utcnow()
+        for model, extra in ((models.Incident, {}), (models.IncidentArchive, {"date_archivage": now})):
+            conn.execute(insert(model), [{
+                "type_inc": "Vidéoprojecteur", "salle": f"B{i}", "description": "Contrôle des requêtes",
+                "statut": "Terminé" if extra else "En attente", "prof_id": prof_id, "departement_id": departement_id,
+                "image_path": f"/uploads/absente_{i}.png" if i % 2 else None,
+                "date_creation": now - timedelta(minutes=i), "date_modification": now - timedelta(minutes=i),
+                **extra
+            } for i in range(INCIDENTS)])
+
+    engine = database.async_engine.sync_engine
+    routes = {}
+    failures = []
+    with TestClient(main.app) as client:
+        for username, prefix in (("prof1", "/prof/"), ("chef1", "/admin/")):
+            client.cookies.clear()
+            location = client.post("/login", data={"username": username, "password": "123"}, follow_redirects=False).headers["location"]
+            for name, budget in QUERY_BUDGETS.items():
+                if not name.startswith(prefix):
+                    continue
+                counts = {}
+                for limit in (1, 50):
+                    separator = "&" if "?" in name else "?"
+                    url = name.replace(prefix + "{id}", location) + f"{separator}limit={limit}"
+                    with count_queries(engine) as counter:
+                        response = client.get(url)
+                    if response.status_code != 200:
+                        failures.append(f"{url} : statut {response.status_code}")
+                    counts[limit] = counter.count
+                routes[name] = {"budget": budget, "limit_1": counts[1], "limit_50": counts[50]}
+                if counts[1] != counts[50]:
+                    failures.append(f"{name} : {counts[1]} requêtes pour 1 ligne, {counts[50]} pour 50")
+                if max(counts.values()) > budget:
+                    failures.append(f"{name} : {max(counts.values())} requêtes pour un budget de {budget}")
+    return {"routes": routes, "failures": failures}
+
+if __name__ == "__main__":
+    report = check()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failures"] else 0)
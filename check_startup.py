@@ -0,0 +1,115 @@
+"""Vérifie le budget de démarrage à froid de l'application.
+
+Mesure, dans un processus neuf, l'import de main.py, les handlers de
+startup et la première requête, puis échoue (code de sortie 1) si un
+budget est dépassé ou si le démarrage exécute du DDL ou hache un mot de
+passe. La base utilisée est une SQLite temporaire migrée au préalable ;
+les sessions et les seaux de connexion sont mis dans des fichiers SQLite
+du même dossier, qui ne doivent pas encore exister après la première
+requête (leurs tables sont créées à la première connexion d'un utilisateur).
+
+Usage :
+    python check_startup.py --import-budget 2.0 --first-request-budget 0.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+DDL_PREFIXES = ("CREATE", "ALTER", "DROP")
+
+def check(import_budget: float, startup_budget: float, first_request_budget: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix="check_startup_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+    # Stockages SQLite hors de la base principale, invisibles pour les événements SQLAlchemy
+    local_stores = {}
+    for backend, path_var, name in (("SESSION_BACKEND", "SESSION_DB_PATH", "sessions.db"),
+                                    ("THROTTLE_BACKEND", "THROTTLE_DB_PATH", "throttle.db")):
+        os.environ.setdefault(backend, "sqlite")
+        os.environ.setdefault(path_var, os.path.join(workdir, name))
+        if os.environ[backend] == "sqlite":
+            local_stores[path_var] = os.environ[path_var]
+
+    # Migrations dans un processus séparé : rien n'est importé ici avant la mesure
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--url", os.environ["DATABASE_URL"]],
+        check=True, capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+    start = time.perf_counter()
+    from sqlalchemy import event
+    import auth
+    import database
+
+    # Espionner le DDL et les hachages déclenchés par l'application elle-même
+    ddl_statements = []
+    password_hashes = 0
+
+    def record_ddl(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(DDL_PREFIXES):
+            ddl_statements.append(statement.strip().split("\n")[0])
+
+    for engine in (database.engine, database.async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", record_ddl)
+
+    original_hash = auth.get_password_hash
+
+    def counting_hash(*args, **kwargs):
+        nonlocal password_hashes
+        password_hashes += 1
+        return original_hash(*args, **kwargs)
+
+    auth.get_password_hash = counting_hash
+
+    import main
+    import_seconds = time.perf_counter() - start
+
+    from fastapi.testclient import TestClient
+    start = time.perf_counter()
+    with TestClient(main.app) as client:
+        startup_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        response = client.get("/")
+        first_request_seconds = time.perf_counter() - start
+    auth.get_password_hash = original_hash
+
+    failures = []
+    if import_seconds > import_budget:
+        failures.append(f"import {import_seconds:.3f}s > {import_budget}s")
+    if startup_seconds > startup_budget:
+        failures.append(f"startup {startup_seconds:.3f}s > {startup_budget}s")
+    if first_request_seconds > first_request_budget:
+        failures.append(f"première requête {first_request_seconds:.3f}s > {first_request_budget}s")
+    if response.status_code != 200:
+        failures.append(f"première requête : statut {response.status_code}")
+    if ddl_statements:
+        failures.append(f"DDL exécuté au démarrage : {ddl_statements}")
+    for path_var, path in local_stores.items():
+        if os.path.exists(path):
+            failures.append(f"{path_var} ({path}) créé au démarrage")
+    if password_hashes:
+        failures.append(f"{password_hashes} mot(s) de passe haché(s) au démarrage")
+
+    return {
+        "import_seconds": round(import_seconds, 3),
+        "startup_seconds": round(startup_seconds, 3),
+        "first_request_seconds": round(first_request_seconds, 3),
+        "ddl_statements": len(ddl_statements),
+        "password_hashes": password_hashes,
+        "failures": failures,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Budget de démarrage à froid")
+    parser.add_argument("--import-budget", type=float, default=float(os.environ.get("STARTUP_IMPORT_BUDGET", "3.0")))
+    parser.add_argument("--startup-budget", type=float, default=float(os.environ.get("STARTUP_BUDGET", "0.5")))
+    parser.add_argument("--first-request-budget", type=float, default=float(os.environ.get("STARTUP_FIRST_REQUEST_BUDGET", "0.5")))
+    args = parser.parse_args()
+
+    report = check(args.import_budget, args.startup_budget, args.first_request_budget)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failures"] else 0)
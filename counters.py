@@ -0,0 +1,94 @@
+"""Compteurs d'incidents par (departement_id, statut, type_inc).
+
+Les routes qui créent ou modifient un incident mettent à jour ces
+compteurs dans la même transaction, ce qui permet de servir les
+statistiques du tableau de bord sans parcourir la table `incidents`.
+Les incidents archivés (archive.py) restent comptés.
+En cas de dérive, `python counters.py` les recalcule entièrement.
+"""
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import models
+
+STATUTS = ("En attente", "En cours", "Terminé")
+
+def _upsert(dialect_name: str, departement_id: int, statut: str, type_inc: str, delta: int):
+    values = {"departement_id": departement_id, "statut": statut, "type_inc": type_inc, "total": delta}
+    if dialect_name == "mysql":
+        stmt = mysql_insert(models.IncidentCounter).values(**values)
+        return stmt.on_duplicate_key_update(total=models.IncidentCounter.total + delta)
+    stmt = sqlite_insert(models.IncidentCounter).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=["departement_id", "statut", "type_inc"],
+        set_={"total": models.IncidentCounter.total + delta}
+    )
+
+async def increment(db, departement_id: int, statut: str, type_inc: str, delta: int = 1):
+    """Ajoute `delta` au compteur, dans la transaction en cours de `db`"""
+    await db.execute(_upsert(db.get_bind().dialect.name, departement_id, statut, type_inc, delta))
+
+async def move(db, departement_id: int, type_inc: str, old_statut: str, new_statut: str):
+    """Reporte un incident d'un statut à un autre"""
+    if old_statut == new_statut:
+        return
+    await increment(db, departement_id, old_statut, type_inc, -1)
+    await increment(db, departement_id, new_statut, type_inc, 1)
+
+async def department_stats(db, departement_id: int) -> dict:
+    """Statistiques d'un département, lues uniquement dans la table des compteurs"""
+    result = await db.execute(
+        select(models.IncidentCounter.statut, models.IncidentCounter.type_inc, models.IncidentCounter.total)
+        .where(models.IncidentCounter.departement_id == departement_id)
+    )
+    par_statut = {statut: 0 for statut in STATUTS}
+    par_type = {}
+    for statut, type_inc, total in result:
+        par_statut[statut] = par_statut.get(statut, 0) + total
+        par_type[type_inc] = par_type.get(type_inc, 0) + total
+    return {
+        "departement_id": departement_id,
+        "total": sum(par_statut.values()),
+        "par_statut": par_statut,
+        "par_type": par_type
+    }
+
+def apply_deltas(conn, deltas):
+    """Applique en une fois des variations {(departement_id, statut, type_inc): delta} (connexion synchrone)"""
+    dialect_name = conn.dialect.name
+    for (departement_id, statut, type_inc), delta in deltas.items():
+        if delta:
+            conn.execute(_upsert(dialect_name, departement_id, statut, type_inc, delta))
+
+def rebuild(db):
+    """Recalcule tous les compteurs depuis les incidents actifs et archivés (session synchrone)"""
+    rows = union_all(*(
+        select(model.departement_id, model.statut, model.type_inc)
+        for model in (models.Incident, models.IncidentArchive)
+    )).subquery()
+    db.execute(delete(models.IncidentCounter))
+    db.execute(insert(models.IncidentCounter).from_select(
+        ["departement_id", "statut", "type_inc", "total"],
+        select(
+            rows.c.departement_id,
+            rows.c.statut,
+            rows.c.type_inc,
+            func.count()
+        ).where(
+            rows.c.departement_id.is_not(None),
+            rows.c.statut.is_not(None),
+            rows.c.type_inc.is_not(None)
+        )
+        .group_by(rows.c.departement_id, rows.c.statut, rows.c.type_inc)
+    ))
+    db.commit()
+
+if __name__ == "__main__":
+    import database
+    db = database.SessionLocal()
+    try:
+        rebuild(db)
+        count = db.query(models.IncidentCounter).count()
+        print(f"✅ Compteurs recalculés : {count} ligne(s)")
+    finally:
+        db.close()
@@ -1,18 +1,118 @@
+import os
+import threading
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 # Modifiez les accès selon votre config MySQL
 # Format sans mot de passe : mysql+pymysql://root@localhost/fstt_incidents
-URL_DATABASE = "mysql+pymysql://root@localhost/incidents_db"
+# La variable d'environnement DATABASE_URL permet d'utiliser une autre base (ex: sqlite:///bench.db)
+URL_DATABASE = os.environ.get("DATABASE_URL", "mysql+pymysql://root@localhost/incidents_db")
 
-engine = create_engine(URL_DATABASE)
+# Pilote asynchrone correspondant : asyncmy pour MySQL, aiosqlite pour les essais locaux
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+asyncmy",
+    "mysql": "mysql+asyncmy",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+URL_DATABASE_ASYNC = os.environ.get("ASYNC_DATABASE_URL", to_async_url(URL_DATABASE))
+
+# Réglages du pool de connexions
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        # SQLite n'a pas de serveur : pas de recyclage ni de dimensionnement à régler
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# Moteur synchrone : démarrage, scripts et outils en ligne de commande
+engine = create_engine(URL_DATABASE, **engine_options(URL_DATABASE))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Pool asynchrone qui mesure l'attente de chaque emprunt de connexion.
+
+    La mesure se fait dans le pool, au moment où la session emprunte
+    réellement une connexion (première requête SQL), et non à l'ouverture
+    de la session.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start)
+
+# Moteur asynchrone : routes de l'application
+async_engine = create_async_engine(
+    URL_DATABASE_ASYNC, poolclass=TimedAsyncQueuePool, **engine_options(URL_DATABASE_ASYNC)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+class PoolMetrics:
+    """Temps d'attente pour obtenir une connexion et saturation du pool asynchrone"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        size = pool.size() if hasattr(pool, "size") else 0
+        checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        # Capacité maximale : connexions permanentes + débordement autorisé (-1 = illimité)
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        capacity = size + max_overflow if max_overflow >= 0 else 0
+        with self._lock:
+            return {
+                "pool_size": size,
+                "checked_out": checked_out,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+                "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+                "checkouts": self.checkouts,
+                "checkout_wait_seconds_total": round(self.wait_total, 6),
+                "checkout_wait_seconds_max": round(self.wait_max, 6),
+            }
+
+pool_metrics = PoolMetrics(async_engine.sync_engine)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    # La connexion n'est empruntée qu'à la première requête SQL de la route
+    async with AsyncSessionLocal() as db:
+        yield db
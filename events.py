@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import threading
+
+# Nombre maximal d'événements en attente par abonné (au-delà, les plus récents sont ignorés)
+SUBSCRIBER_QUEUE_SIZE = 100
+# Intervalle des commentaires keep-alive du flux SSE
+HEARTBEAT_INTERVAL = 25
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def departement_channel(departement_id: int) -> str:
+    return f"departement:{departement_id}"
+
+def session_channel(session_token: str) -> str:
+    return f"session:{session_token}"
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Formate un événement au format text/event-stream"""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class Subscription:
+    """File d'événements d'un client connecté, alimentée par le broker"""
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event: dict):
+        # Exécuté dans la boucle de l'abonné ; un client trop lent perd des événements
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    async def get(self, timeout: float):
+        """Attend le prochain événement, retourne None après `timeout` secondes"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class EventBroker:
+    """Interface de diffusion des événements vers les flux SSE.
+
+    Une implémentation multi-workers (Redis pub/sub, LISTEN/NOTIFY...) doit
+    fournir les mêmes méthodes ; `publish` peut être appelée depuis
+    n'importe quel thread.
+    """
+    def subscribe(self, channels) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def publish(self, channel: str, event: dict):
+        raise NotImplementedError
+
+class InMemoryBroker(EventBroker):
+    """Diffusion dans le processus courant (un seul worker uvicorn)"""
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels) -> Subscription:
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel: str, event: dict):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            # Les routes synchrones publient depuis le threadpool
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Boucle de l'abonné déjà fermée
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subscribers in self._channels.values() for s in subscribers})
+
+def get_broker() -> EventBroker:
+    """Choisit le broker selon EVENT_BROKER ('memory' par défaut)"""
+    kind = os.environ.get("EVENT_BROKER", "memory")
+    if kind == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"EVENT_BROKER inconnu: {kind}")
@@ -0,0 +1,93 @@
+"""Export en flux des incidents d'un département (CSV ou JSON Lines).
+
+Les lignes sont lues par lots sur un curseur côté serveur (stream_results
+/ yield_per) et écrites au fil de l'eau, éventuellement compressées en
+gzip : la mémoire utilisée ne dépend pas du nombre d'incidents exportés.
+Les incidents archivés (archive.py) suivent les incidents actifs.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+from sqlalchemy import select
+import database
+import models
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+COLUMNS = (
+    "id", "date_creation", "date_modification", "professeur", "type_inc",
+    "salle", "description", "statut", "commentaire_chef", "image_path", "archive",
+)
+
+def _select(model, departement_id: int, statut: str = None, date_from=None, date_to=None):
+    stmt = (
+        select(
+            model.id, model.date_creation, model.date_modification,
+            models.User.nom_complet.label("professeur"),
+            model.type_inc, model.salle, model.description, model.statut,
+            model.commentaire_chef, model.image_path
+        )
+        .outerjoin(models.User, models.User.id == model.prof_id)
+        .where(model.departement_id == departement_id)
+    )
+    if statut:
+        stmt = stmt.where(model.statut == statut)
+    if date_from:
+        stmt = stmt.where(model.date_creation >= date_from)
+    if date_to:
+        stmt = stmt.where(model.date_creation < date_to)
+    # Ordre de l'index (departement_id, date_creation) : pas de tri en mémoire côté base
+    return stmt.order_by(model.date_creation, model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+def _record(row, archived: bool) -> dict:
+    record = dict(row._mapping)
+    for key in ("date_creation", "date_modification"):
+        if record[key] is not None:
+            record[key] = record[key].isoformat()
+    record["archive"] = archived
+    return record
+
+def _encode_csv(records, header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+def _encode_jsonl(records) -> str:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+async def stream_incidents(departement_id: int, fmt: str = "csv", statut: str = None,
+                           date_from=None, date_to=None, include_archive: bool = True, compress: bool = False):
+    """Générateur asynchrone des morceaux (bytes) de l'export, un par lot de lignes"""
+    # wbits=31 : en-tête et somme de contrôle gzip, le flux forme un fichier .gz valide
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    sources = [(models.Incident, False)]
+    if include_archive:
+        sources.append((models.IncidentArchive, True))
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    header = fmt == "csv"
+    if header:
+        yield encode(_encode_csv([], header=True))
+    # Session propre au flux : celle des dépendances FastAPI est fermée avant l'envoi du corps
+    async with database.AsyncSessionLocal() as db:
+        for model, archived in sources:
+            result = await db.stream(_select(model, departement_id, statut, date_from, date_to))
+            async for partition in result.partitions():
+                records = [_record(row, archived) for row in partition]
+                text = _encode_csv(records, header=False) if fmt == "csv" else _encode_jsonl(records)
+                chunk = encode(text)
+                if chunk:
+                    yield chunk
+    if compressor:
+        yield compressor.flush()
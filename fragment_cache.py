@@ -0,0 +1,66 @@
+"""Cache des fragments HTML (lignes d'incidents) déjà rendus.
+
+La clé inclut `date_modification` : toute mise à jour d'un incident
+produit une nouvelle clé, l'ancien fragment n'est plus jamais lu et finit
+évincé par l'ordre LRU. La mémoire occupée est plafonnée en octets.
+"""
+import os
+import threading
+from collections import OrderedDict
+import metrics
+
+FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+cache_requests = metrics.registry.register(metrics.Counter(
+    "fragment_cache_requests_total", "Lectures du cache de fragments HTML (hit/miss)"
+))
+cache_evictions = metrics.registry.register(metrics.Counter(
+    "fragment_cache_evictions_total", "Fragments évincés pour respecter le plafond mémoire"
+))
+
+class FragmentCache:
+    def __init__(self, name: str, max_bytes: int = FRAGMENT_CACHE_MAX_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.registry.register(metrics.Gauge(
+            f"fragment_cache_{name}_bytes", "Taille des fragments en cache", lambda: self.size_bytes
+        ))
+        metrics.registry.register(metrics.Gauge(
+            f"fragment_cache_{name}_entries", "Nombre de fragments en cache", lambda: len(self._entries)
+        ))
+
+    def get_or_render(self, key, render) -> str:
+        """Retourne le fragment en cache pour `key`, ou l'obtient avec `render()` et le stocke"""
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+        if fragment is not None:
+            cache_requests.inc(cache=self.name, result="hit")
+            return fragment
+
+        cache_requests.inc(cache=self.name, result="miss")
+        fragment = render()
+        # Approximation : un caractère compte pour un octet (le HTML est surtout ASCII)
+        size = len(fragment)
+        if size > self.max_bytes:
+            return fragment
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous)
+            self._entries[key] = fragment
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                cache_evictions.inc(cache=self.name)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
@@ -0,0 +1,247 @@
+"""File de tâches d'arrière-plan durable (outbox transactionnelle).
+
+Une route qui doit déclencher un travail annexe (e-mail, miniatures,
+audit) appelle `enqueue(db, ...)` avant son commit : la tâche est écrite
+dans la table `jobs` dans la même transaction que l'incident, elle
+n'existe donc que si le changement a bien été enregistré, et la réponse
+HTTP n'attend pas son exécution.
+
+Les workers (JobWorker) réservent les tâches par lots : SELECT ... FOR
+UPDATE SKIP LOCKED sous MySQL, puis un bail (jeton + date d'expiration)
+posé par un UPDATE qui répète la condition de sélection, ce qui suffit
+sous SQLite où les écritures sont sérialisées. Un bail expiré (worker
+arrêté brutalement) rend la tâche à nouveau disponible. En cas d'erreur,
+la tâche est retentée avec un délai exponentiel, puis passe au statut
+"echec" (dead letter) après `max_tentatives`. Chaque type a sa limite de
+tâches simultanées par processus, et les tâches de même `coalesce_key`
+sont exécutées ensemble en un seul appel.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import OperationalError
+import metrics
+import models
+
+logger = logging.getLogger("incidents.jobs")
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ECHEC = "echec"
+
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1"))
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "20"))
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "300"))
+JOB_BACKOFF_BASE = float(os.environ.get("JOB_BACKOFF_BASE", "5"))
+JOB_BACKOFF_MAX = float(os.environ.get("JOB_BACKOFF_MAX", "3600"))
+# Durée de conservation des tâches terminées
+JOB_KEEP_DAYS = int(os.environ.get("JOB_KEEP_DAYS", "7"))
+
+jobs_executed = metrics.registry.register(metrics.Counter(
+    "jobs_total", "Tâches d'arrière-plan exécutées, par type et résultat"
+))
+
+class JobType:
+    def __init__(self, name: str, handler, concurrency: int, max_attempts: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+registry = {}
+
+def register(name: str, concurrency: int = 1, max_attempts: int = 5):
+    """Décorateur : déclare le traitement d'un type de tâche.
+
+    Le traitement reçoit la liste des payloads (plusieurs quand des tâches
+    ont été regroupées par `coalesce_key`) ; une exception déclenche un
+    nouvel essai de tout le groupe.
+    """
+    def decorator(handler):
+        registry[name] = JobType(name, handler, concurrency, max_attempts)
+        return handler
+    return decorator
+
+def enqueue(db, job_type: str, payload: dict, delay: float = 0, coalesce_key: str = None):
+    """Ajoute une tâche à la session `db` (synchrone ou asynchrone) ; elle est écrite au commit"""
+    if job_type not in registry:
+        raise ValueError(f"Type de tâche inconnu : {job_type}")
+    job = models.Job(
+        type=job_type,
+        payload=json.dumps(payload, ensure_ascii=False, default=str),
+        statut=EN_ATTENTE,
+        coalesce_key=coalesce_key,
+        tentatives=0,
+        max_tentatives=registry[job_type].max_attempts,
+        executer_apres=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    return job
+
+def backoff_delay(attempts: int) -> float:
+    """Délai avant le nouvel essai : exponentiel, plafonné, avec une part aléatoire"""
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+def claim(conn, job_type: str, limit: int, lease_seconds: int = JOB_LEASE_SECONDS):
+    """Réserve jusqu'à `limit` tâches (et leurs tâches regroupées) ; retourne (jeton, lignes)"""
+    jobs = models.Job.__table__
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    claimable = and_(jobs.c.type == job_type, or_(
+        and_(jobs.c.statut == EN_ATTENTE, jobs.c.executer_apres <= now),
+        and_(jobs.c.statut == EN_COURS, jobs.c.bail_expire < now)
+    ))
+    ids = conn.execute(
+        select(jobs.c.id).where(claimable).order_by(jobs.c.executer_apres).limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        return token, []
+
+    lease = {"statut": EN_COURS, "bail_jeton": token, "bail_expire": now + timedelta(seconds=lease_seconds)}
+    # Condition répétée : sans FOR UPDATE (SQLite), une tâche prise entre-temps n'est pas réservée deux fois
+    conn.execute(update(jobs).where(jobs.c.id.in_(ids), claimable).values(**lease))
+    keys = conn.execute(
+        select(jobs.c.coalesce_key).distinct()
+        .where(jobs.c.bail_jeton == token, jobs.c.coalesce_key.is_not(None))
+    ).scalars().all()
+    if keys:
+        # Les tâches de même clé partent avec la première, sans attendre leur propre délai
+        conn.execute(update(jobs).where(
+            jobs.c.type == job_type, jobs.c.coalesce_key.in_(keys), jobs.c.statut == EN_ATTENTE
+        ).values(**lease))
+    rows = conn.execute(select(jobs).where(jobs.c.bail_jeton == token).order_by(jobs.c.id)).all()
+    return token, rows
+
+def _groups(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.coalesce_key or f"id:{row.id}", []).append(row)
+    return list(groups.values())
+
+class JobWorker:
+    """Threads qui réservent et exécutent les tâches des types enregistrés"""
+    def __init__(self, engine, types=None, poll_interval: float = JOB_POLL_INTERVAL,
+                 batch_size: int = JOB_BATCH_SIZE, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.engine = engine
+        self.types = [registry[name] for name in (types or registry)]
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._running = Counter()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self) -> int:
+        """Réserve et lance les tâches disponibles ; retourne le nombre de groupes lancés"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=sum(job_type.concurrency for job_type in self.types) or 1,
+                thread_name_prefix="job"
+            )
+        started = 0
+        for job_type in self.types:
+            with self._lock:
+                free = job_type.concurrency - self._running[job_type.name]
+            if free <= 0:
+                continue
+            with self.engine.begin() as conn:
+                token, rows = claim(conn, job_type.name, min(free, self.batch_size), self.lease_seconds)
+            for group in _groups(rows):
+                with self._lock:
+                    self._running[job_type.name] += 1
+                self._executor.submit(self._execute, job_type, token, group)
+                started += 1
+        return started
+
+    def _execute(self, job_type: JobType, token: str, group):
+        jobs = models.Job.__table__
+        ids = [row.id for row in group]
+        try:
+            try:
+                job_type.handler([json.loads(row.payload) for row in group])
+            except Exception as e:
+                attempts = max(row.tentatives for row in group) + 1
+                values = {"tentatives": attempts, "derniere_erreur": repr(e)[:1000], "bail_jeton": None, "bail_expire": None}
+                if attempts >= max(row.max_tentatives for row in group):
+                    values.update(statut=ECHEC, date_fin=datetime.utcnow())
+                    resultat = ECHEC
+                else:
+                    values.update(statut=EN_ATTENTE, executer_apres=datetime.utcnow() + timedelta(seconds=backoff_delay(attempts)))
+                    resultat = "nouvel_essai"
+                logger.warning("Erreur de la tâche %s %s: %r", job_type.name, ids, e)
+            else:
+                values = {"statut": TERMINE, "date_fin": datetime.utcnow(), "bail_jeton": None, "bail_expire": None}
+                resultat = TERMINE
+            with self.engine.begin() as conn:
+                # Bail perdu (expiré puis repris ailleurs) : l'autre worker décide du résultat
+                conn.execute(update(jobs).where(jobs.c.id.in_(ids), jobs.c.bail_jeton == token).values(**values))
+            jobs_executed.inc(len(ids), type=job_type.name, resultat=resultat)
+        except Exception:
+            logger.exception("Erreur d'enregistrement du résultat des tâches %s", ids)
+        finally:
+            with self._lock:
+                self._running[job_type.name] -= 1
+
+    def purge(self, keep_days: int = JOB_KEEP_DAYS) -> int:
+        """Supprime les tâches terminées depuis plus de `keep_days` jours (les échecs sont gardés)"""
+        jobs = models.Job.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(delete(jobs).where(
+                jobs.c.statut == TERMINE, jobs.c.date_fin < datetime.utcnow() - timedelta(days=keep_days)
+            )).rowcount
+
+    def _run(self):
+        polls = 0
+        while not self._stop.is_set():
+            try:
+                started = self.run_once()
+                polls += 1
+                if polls % 3600 == 0:
+                    self.purge()
+            except OperationalError as e:
+                # Verrou SQLite ou interblocage MySQL entre workers : nouvel essai au prochain tour
+                logger.warning("Réservation des tâches impossible: %s", e)
+                started = 0
+            except Exception:
+                logger.exception("Erreur du worker de tâches")
+                started = 0
+            if not started:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="job-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+def retry_failed(engine, job_type: str = None) -> int:
+    """Remet en file les tâches en échec (dead letter), tentatives remises à zéro"""
+    jobs = models.Job.__table__
+    stmt = update(jobs).where(jobs.c.statut == ECHEC)
+    if job_type:
+        stmt = stmt.where(jobs.c.type == job_type)
+    with engine.begin() as conn:
+        return conn.execute(stmt.values(
+            statut=EN_ATTENTE, tentatives=0, executer_apres=datetime.utcnow(), date_fin=None
+        )).rowcount
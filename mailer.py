@@ -0,0 +1,30 @@
+"""Envoi des e-mails de l'application par SMTP.
+
+En développement, `python smtp_standin.py` écoute sur SMTP_HOST:SMTP_PORT
+(localhost:1025 par défaut) et enregistre les messages reçus en .eml.
+"""
+import os
+import smtplib
+from email.message import EmailMessage
+
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "1025"))
+SMTP_USER = os.environ.get("SMTP_USER")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "false").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "10"))
+MAIL_FROM = os.environ.get("MAIL_FROM", "incidents@fstt.ac.ma")
+
+def send(to: str, subject: str, body: str):
+    """Envoie un e-mail texte ; une erreur SMTP est propagée (la tâche sera retentée)"""
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(message)
@@ -1,24 +1,46 @@
 from fastapi import FastAPI, Depends, Form, Request, HTTPException, Response, File, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-import models, database, auth
-from datetime import datetime, timedelta
-import secrets
+from brotli_asgi import BrotliMiddleware
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+import models, database, auth, sessions, events, counters, search, metrics, throttle, export, bulk_import, jobs, tasks, upload_store
+from fragment_cache import FragmentCache
+from markupsafe import Markup
+from uploads import UPLOAD_DIR, save_upload_file, UploadSizeLimitMiddleware
+from pagination import paginate_incidents
+import io
+import json
 import uuid
 import os
 import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List
 from pathlib import Path
 
+# Aucun accès à la base à l'import ni au démarrage : le schéma est géré par les
+# migrations (python manage.py migrate), les données de démo par manage.py seed-demo
 app = FastAPI()
-models.Base.metadata.create_all(bind=database.engine)
-templates = Jinja2Templates(directory="templates")
+templates = metrics.InstrumentedTemplates(directory="templates")
+metrics.instrument_engine(database.async_engine.sync_engine)
+logger = metrics.configure_logging()
 
 # Créer les dossiers nécessaires
-UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Vignettes et aperçus générés par la tâche "miniatures" après chaque signalement avec photo
+image_pipeline = tasks.image_pipeline
+templates.env.filters["thumbnail"] = image_pipeline.thumbnail_url
+templates.env.filters["preview"] = image_pipeline.preview_url
+# Lignes d'incidents déjà rendues, réutilisées tant que l'incident n'a pas changé
+row_cache = FragmentCache("incident_rows")
+# Limite de taille appliquée pendant la réception du corps des signalements
+app.add_middleware(UploadSizeLimitMiddleware, path_prefix="/prof/signaler/")
 
 # Créer le dossier static pour les fichiers statiques (CSS, JS, images)
 STATIC_DIR = Path("static")
@@ -27,8 +49,26 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 
-# Stockage des sessions actives
-active_sessions = {}
+# Stockage des sessions actives (mémoire ou partagé entre workers, voir sessions.py)
+session_store = sessions.shared_backend()
+session_sweeper = sessions.SessionSweeper(session_store)
+
+# Limitation des tentatives de connexion, avant tout calcul bcrypt (voir throttle.py)
+login_throttle = throttle.LoginThrottle(throttle.get_backend())
+throttle_sweeper = throttle.ThrottleSweeper(login_throttle.backend)
+
+# Travail annexe (e-mails, miniatures, audit) écrit dans la table jobs avec la transaction
+# de la route (voir jobs.py) ; exécuté ici ou par des workers séparés (python manage.py worker)
+JOBS_WORKER_IN_APP = os.environ.get("JOBS_WORKER_IN_APP", "true").lower() in ("1", "true", "yes")
+job_worker = jobs.JobWorker(database.engine)
+
+# Suppression des photos qui ne sont plus référencées (voir upload_store.py) : par défaut
+# planifiée à part (python upload_store.py gc) pour ne tourner que dans un seul processus
+UPLOAD_GC_IN_APP = os.environ.get("UPLOAD_GC_IN_APP", "false").lower() in ("1", "true", "yes")
+upload_sweeper = upload_store.UploadSweeper(database.engine, UPLOAD_DIR)
+
+# Diffusion des événements temps réel (expiration de session, incidents) vers les flux SSE
+event_broker = events.get_broker()
 
 def add_no_cache_headers(response: Response):
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
@@ -39,55 +79,92 @@ def add_no_cache_headers(response: Response):
     response.headers["X-XSS-Protection"] = "1; mode=block"
     return response
 
-def create_session_token(user_id: int) -> str:
-    token = secrets.token_urlsafe(32)
-    active_sessions[token] = {
-        "user_id": user_id,
-        "created_at": datetime.now(),
-        "page_token": None
-    }
-    return token
+def create_session_token(user: models.User) -> str:
+    return session_store.create(user.id, sessions.principal_from_user(user))
 
 def create_page_token(session_token: str) -> str:
     page_token = str(uuid.uuid4())
-    if session_token in active_sessions:
-        active_sessions[session_token]["page_token"] = page_token
+    session_store.set_page_token(session_token, page_token)
     return page_token
 
-def validate_session(request: Request, expected_user_id: int) -> tuple:
+def current_principal(request: Request):
+    """Dépendance : utilisateur connecté (id, rôle, départements, nom) lu dans la session, sans accès à la base"""
     session_token = request.cookies.get("session_token")
-    if not session_token or session_token not in active_sessions:
-        return False, None
-    
-    session_data = active_sessions[session_token]
-    if session_data["user_id"] != expected_user_id:
-        return False, None
+    if not session_token:
+        return None
     
-    if datetime.now() - session_data["created_at"] > timedelta(hours=24):
-        del active_sessions[session_token]
+    # Les sessions expirées ne sont jamais retournées ; le balayeur de fond les supprime
+    session_data = session_store.get(session_token)
+    if not session_data or not session_data.get("principal"):
+        return None
+    return {**session_data["principal"], "user_id": session_data["user_id"], "token": session_token}
+
+def is_authorized(principal, user_id: int, roles=None) -> bool:
+    if not principal or principal["user_id"] != user_id:
+        return False
+    return roles is None or principal["role"] in roles
+
+def validate_session(request: Request, expected_user_id: int) -> tuple:
+    principal = current_principal(request)
+    if not is_authorized(principal, expected_user_id):
         return False, None
-    
-    return True, session_token
+    return True, principal["token"]
+
+def _notify_session_expired(session_token: str):
+    event_broker.publish(events.session_channel(session_token), {"type": "session-expired"})
 
 def invalidate_session(session_token: str):
-    if session_token and session_token in active_sessions:
-        del active_sessions[session_token]
+    if session_token:
+        session_store.delete(session_token)
+        _notify_session_expired(session_token)
 
-async def save_upload_file(upload_file: UploadFile) -> str:
-    """Sauvegarde le fichier uploadé et retourne le chemin"""
-    if not upload_file:
-        return None
-    
-    # Générer un nom unique
-    file_extension = upload_file.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
-    
-    # Sauvegarder le fichier
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    
-    return f"/uploads/{unique_filename}"
+# Sessions fermées par sessions.invalidate_user (droits modifiés, voir models.py) : prévenir les pages ouvertes
+sessions.invalidation_hooks.append(_notify_session_expired)
+
+def _incident_event_data(incident: models.Incident) -> dict:
+    return {
+        "id": incident.id,
+        "statut": incident.statut,
+        "type_inc": incident.type_inc,
+        "salle": incident.salle,
+        "commentaire_chef": incident.commentaire_chef
+    }
+
+def publish_incident_event(event_type: str, incident: models.Incident):
+    """Notifie le département et le professeur concerné d'une création ou mise à jour d'incident"""
+    event = {"type": event_type, **_incident_event_data(incident)}
+    event_broker.publish(events.departement_channel(incident.departement_id), event)
+    event_broker.publish(events.user_channel(incident.prof_id), event)
+
+def publish_incidents_updated(incidents):
+    """Un seul événement par département et par professeur pour une mise à jour groupée"""
+    channels = {}
+    for inc in incidents:
+        data = _incident_event_data(inc)
+        channels.setdefault(events.departement_channel(inc.departement_id), []).append(data)
+        channels.setdefault(events.user_channel(inc.prof_id), []).append(data)
+    for channel, items in channels.items():
+        event_broker.publish(channel, {"type": "incidents-updated", "incidents": items})
+
+def render_incident_rows(template_name: str, variant: tuple, incidents, extra_key=None, **context) -> Markup:
+    """Assemble les lignes du tableau à partir du cache de fragments.
+
+    La clé contient date_modification ainsi que le statut et le commentaire
+    (deux mises à jour dans la même seconde ne changent pas un DATETIME
+    MySQL sans fraction), et les URLs des miniatures, pour qu'une ligne
+    soit rendue à nouveau dès que ses dérivés d'image sont disponibles. `extra_key(inc)` ajoute les données
+    d'autres tables affichées dans la ligne (ex: nom du professeur). Seuls
+    les rendus (caches manqués) sont mesurés dans template_render_seconds.
+    """
+    rows = []
+    for inc in incidents:
+        key = (
+            inc.id, inc.date_modification, inc.statut, inc.commentaire_chef, template_name, variant,
+            image_pipeline.thumbnail_url(inc.image_path), image_pipeline.preview_url(inc.image_path),
+            extra_key(inc) if extra_key else None
+        )
+        rows.append(row_cache.get_or_render(key, lambda: templates.render(template_name, inc=inc, **context)))
+    return Markup("".join(rows))
 
 # --- AUTHENTIFICATION ---
 @app.get("/favicon.ico")
@@ -111,24 +188,51 @@ def login_page(request: Request):
     response.delete_cookie("session_token")
     return add_no_cache_headers(response)
 
-@app.post("/login")
-def login(username: str = Form(...), password: str = Form(...), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.username == username).first()
+def check_login_throttle(request: Request, username: str = Form(...)):
+    """Dépendance résolue avant la session de base : un refus n'emprunte pas de connexion.
+
+    Synchrone, donc exécutée dans le pool de threads : l'attente d'un verrou
+    SQLite (THROTTLE_BACKEND=sqlite) ne bloque pas la boucle d'événements.
+    """
+    retry_after = login_throttle.check(username, throttle.client_ip(request))
+    if retry_after:
+        raise throttle.LoginThrottled(retry_after)
+
+@app.post("/login", dependencies=[Depends(check_login_throttle)])
+async def login(
+    username: str = Form(...),
+    password: str = Form(...),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    user = result.scalars().first()
+    # Libérer la connexion pendant le calcul bcrypt
+    await db.commit()
     
-    # Debug
     if user:
-        print(f"✅ Utilisateur trouvé: {user.username}")
-        print(f"Hash en base: {user.hashed_password[:50]}...")
-        is_valid = auth.verify_password(password, user.hashed_password)
-        print(f"Vérification mot de passe: {is_valid}")
+        is_valid = await auth.verify_password_async(password, user.hashed_password)
     else:
-        print(f"❌ Utilisateur '{username}' non trouvé")
+        # Même durée de réponse qu'un compte existant : l'existence d'un nom ne se devine pas au chronomètre
+        is_valid = await auth.verify_dummy_async(password)
+    metrics.log_sampled(
+        logger, "login",
+        username=username,
+        resultat="succes" if is_valid else ("mot_de_passe_invalide" if user else "utilisateur_inconnu")
+    )
     
-    if not user or not auth.verify_password(password, user.hashed_password):
+    if not is_valid:
         response = RedirectResponse(url="/?error=1", status_code=303)
         return add_no_cache_headers(response)
     
-    session_token = create_session_token(user.id)
+    # Mise à niveau transparente du hash si le coût bcrypt a changé
+    if auth.needs_rehash(user.hashed_password):
+        new_hash = await auth.get_password_hash_async(password)
+        await db.execute(
+            update(models.User).where(models.User.id == user.id).values(hashed_password=new_hash)
+        )
+        await db.commit()
+    
+    session_token = create_session_token(user)
     
     if user.role == "chef":
         response = RedirectResponse(url=f"/admin/{user.id}", status_code=303)
@@ -165,30 +269,97 @@ def check_session(request: Request, user_id: int):
         return JSONResponse({"valid": False}, status_code=401)
     return JSONResponse({"valid": True})
 
+@app.get("/events/{user_id}")
+async def event_stream(request: Request, user_id: int):
+    """Flux Server-Sent Events : expiration de session et incidents du département ou du professeur"""
+    principal = current_principal(request)
+    if not is_authorized(principal, user_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    
+    session_token = principal["token"]
+    channels = [events.session_channel(session_token), events.user_channel(user_id)]
+    if principal["role"] == "chef" and principal["chef_departement_id"]:
+        channels.append(events.departement_channel(principal["chef_departement_id"]))
+    
+    async def stream():
+        subscription = event_broker.subscribe(channels)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                session_data = session_store.get(session_token)
+                if not session_data:
+                    yield events.format_sse("session-expired", {})
+                    return
+                timeout = min(events.HEARTBEAT_INTERVAL, session_data["expires_at"] - time.time())
+                event = await subscription.get(timeout)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event["type"] == "session-expired":
+                    yield events.format_sse("session-expired", {})
+                    return
+                else:
+                    yield events.format_sse(event["type"], event)
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"X-Accel-Buffering": "no"})
+
+# --- SUPERVISION ---
+def _pool_gauge(key):
+    return lambda: database.pool_metrics.snapshot()[key]
+
+for _name, _key, _help in (
+    ("db_pool_checked_out", "checked_out", "Connexions actuellement empruntées au pool"),
+    ("db_pool_saturation", "saturation", "Part de la capacité du pool utilisée"),
+    ("db_pool_checkout_wait_seconds_total", "checkout_wait_seconds_total", "Temps total d'attente d'une connexion"),
+    ("db_pool_checkout_wait_seconds_max", "checkout_wait_seconds_max", "Plus longue attente d'une connexion"),
+):
+    metrics.registry.register(metrics.Gauge(_name, _help, _pool_gauge(_key)))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Métriques au format texte Prometheus"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/pool")
+def pool_metrics():
+    """Attente d'obtention des connexions et saturation du pool de la base"""
+    return JSONResponse(database.pool_metrics.snapshot())
+
 # --- ESPACE PROFESSEUR ---
 @app.get("/prof/{user_id}", response_class=HTMLResponse)
-def prof_dashboard(request: Request, user_id: int, db: Session = Depends(database.get_db)):
-    is_valid, session_token = validate_session(request, user_id)
-    if not is_valid:
-        response = RedirectResponse(url="/", status_code=303)
-        return add_no_cache_headers(response)
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or user.role not in ["professeur", "prof"]:
+async def prof_dashboard(
+    request: Request,
+    user_id: int,
+    cursor: str = None,
+    direction: str = "next",
+    limit: int = None,
+    vue: str = "actifs",
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    if not is_authorized(principal, user_id, ("professeur", "prof")):
         response = RedirectResponse(url="/", status_code=303)
         return add_no_cache_headers(response)
 
-    page_token = create_page_token(session_token)
+    page_token = create_page_token(principal["token"])
     
-    # Récupérer les incidents du professeur
-    my_incidents = db.query(models.Incident).filter(
-        models.Incident.prof_id == user_id
-    ).order_by(models.Incident.date_creation.desc()).all()
+    # Récupérer une page des incidents du professeur (table active, ou archive pour l'historique)
+    historique = vue == "historique"
+    model = models.IncidentArchive if historique else models.Incident
+    page = await paginate_incidents(
+        db,
+        select(model).where(model.prof_id == user_id),
+        cursor=cursor, direction=direction, limit=limit, model=model
+    )
     
     response = templates.TemplateResponse("prof.html", {
         "request": request,
-        "incidents": my_incidents,
-        "user": user,
+        "incidents": page.items,
+        "incident_rows": render_incident_rows("_prof_row.html", (historique,), page.items),
+        "historique": historique,
+        "page": page,
+        "user": principal,
         "user_id": user_id,
         "page_token": page_token
     })
@@ -202,97 +373,370 @@ async def add_incident(
     salle: str = Form(...), 
     desc: str = Form(...),
     image: UploadFile = File(None),
-    db: Session = Depends(database.get_db)
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    is_valid, _ = validate_session(request, user_id)
-    if not is_valid:
+    if not is_authorized(principal, user_id):
         return RedirectResponse(url="/", status_code=303)
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or not user.departement_id:
+    if not principal["departement_id"]:
         raise HTTPException(status_code=400, detail="Professeur sans département")
     
-    # Sauvegarder l'image si elle existe
+    # Sauvegarder l'image avant la première requête SQL : aucune connexion n'est tenue pendant l'écriture
     image_path = None
     if image and image.filename:
-        image_path = await save_upload_file(image)
+        image_path = await save_upload_file(image, UPLOAD_DIR)
     
     new_inc = models.Incident(
         type_inc=type_inc, 
         salle=salle, 
         description=desc, 
         prof_id=user_id,
-        departement_id=user.departement_id,
+        departement_id=principal["departement_id"],
         image_path=image_path
     )
     db.add(new_inc)
-    db.commit()
+    await db.flush()
+    await counters.increment(db, new_inc.departement_id, new_inc.statut, new_inc.type_inc)
+    tasks.enqueue_chef_notification(db, new_inc)
+    if image_path:
+        await upload_store.add_reference(db, image_path)
+        jobs.enqueue(db, "miniatures", {"image_path": image_path})
+    await db.commit()
+    publish_incident_event("incident-created", new_inc)
     return RedirectResponse(url=f"/prof/{user_id}", status_code=303)
 
 # --- ESPACE CHEF DE DEPARTEMENT ---
 @app.get("/admin/{user_id}", response_class=HTMLResponse)
-def admin_dashboard(request: Request, user_id: int, db: Session = Depends(database.get_db)):
-    is_valid, session_token = validate_session(request, user_id)
-    if not is_valid:
-        response = RedirectResponse(url="/", status_code=303)
-        return add_no_cache_headers(response)
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user or user.role != "chef":
+async def admin_dashboard(
+    request: Request,
+    user_id: int,
+    cursor: str = None,
+    direction: str = "next",
+    limit: int = None,
+    vue: str = "actifs",
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    if not is_authorized(principal, user_id, ("chef",)):
         response = RedirectResponse(url="/", status_code=303)
         return add_no_cache_headers(response)
 
-    page_token = create_page_token(session_token)
+    departement_id = principal["chef_departement_id"]
+    page_token = create_page_token(principal["token"])
     
-    # Récupérer uniquement les incidents du département du chef
-    incidents_departement = db.query(models.Incident).filter(
-        models.Incident.departement_id == user.chef_departement_id
-    ).order_by(models.Incident.date_creation.desc()).all()
+    # Récupérer une page des incidents du département du chef (table active, ou archive pour l'historique)
+    historique = vue == "historique"
+    model = models.IncidentArchive if historique else models.Incident
+    page = await paginate_incidents(
+        db,
+        select(model).options(joinedload(model.professeur)).where(model.departement_id == departement_id),
+        cursor=cursor, direction=direction, limit=limit, model=model
+    )
+    
+    stats = await counters.department_stats(db, departement_id)
     
     response = templates.TemplateResponse("admin.html", {
         "request": request,
-        "incidents": incidents_departement,
-        "user": user,
+        "incidents": page.items,
+        "incident_rows": render_incident_rows(
+            "_admin_row.html", (user_id, historique), page.items,
+            extra_key=lambda inc: inc.professeur.nom_complet, user_id=user_id, readonly=historique
+        ),
+        "historique": historique,
+        "page": page,
+        "stats": stats,
+        "user": principal,
         "user_id": user_id,
         "page_token": page_token
     })
     return add_no_cache_headers(response)
 
+@app.get("/admin/stats/{user_id}")
+async def admin_stats(
+    request: Request,
+    user_id: int,
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """Statistiques du département, lues dans la table des compteurs"""
+    if not is_authorized(principal, user_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    if principal["role"] != "chef":
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    
+    return JSONResponse(await counters.department_stats(db, principal["chef_departement_id"]))
+
+@app.get("/admin/search/{user_id}")
+async def admin_search(
+    request: Request,
+    user_id: int,
+    q: str,
+    statut: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    page: int = 1,
+    limit: int = search.DEFAULT_LIMIT,
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """Recherche plein texte dans les incidents du département, classés par pertinence"""
+    if not is_authorized(principal, user_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    if principal["role"] != "chef":
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    
+    incidents, has_more = await search.search_incidents(
+        db, principal["chef_departement_id"], q,
+        statut=statut, date_from=date_from, date_to=date_to, page=page, limit=limit
+    )
+    return JSONResponse({
+        "page": page,
+        "has_more": has_more,
+        "results": [{
+            "id": inc.id,
+            "date_creation": inc.date_creation.isoformat(),
+            "professeur": inc.professeur.nom_complet if inc.professeur else None,
+            "type_inc": inc.type_inc,
+            "salle": inc.salle,
+            "description": inc.description,
+            "statut": inc.statut
+        } for inc in incidents]
+    })
+
+@app.get("/admin/export/{user_id}")
+def admin_export(
+    user_id: int,
+    format: str = "csv",
+    statut: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    archives: bool = True,
+    gzip: bool = False,
+    principal: dict = Depends(current_principal)
+):
+    """Export en flux (CSV ou JSON Lines, gzip en option) des incidents du département"""
+    if not is_authorized(principal, user_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    if principal["role"] != "chef":
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="Format inconnu (csv ou jsonl)")
+    if statut and statut not in counters.STATUTS:
+        raise HTTPException(status_code=400, detail="Statut inconnu")
+    
+    departement_id = principal["chef_departement_id"]
+    filename = f"incidents_departement_{departement_id}_{datetime.utcnow():%Y%m%d}.{format}"
+    media_type = export.FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    response = StreamingResponse(
+        export.stream_incidents(
+            departement_id, format, statut=statut, date_from=date_from, date_to=date_to,
+            include_archive=archives, compress=gzip
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+    return add_no_cache_headers(response)
+
+@app.post("/admin/import/{user_id}")
+def admin_import(
+    user_id: int,
+    kind: str = Form(...),
+    fichier: UploadFile = File(...),
+    principal: dict = Depends(current_principal)
+):
+    """Import CSV de professeurs ou d'incidents du département ; répond en JSON Lines au fil de l'import"""
+    if not is_authorized(principal, user_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    if principal["role"] != "chef":
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    if kind not in bulk_import.KINDS:
+        raise HTTPException(status_code=400, detail="Type d'import inconnu (utilisateurs ou incidents)")
+    
+    importer = bulk_import.Importer(database.engine, departement_id=principal["chef_departement_id"])
+    # FastAPI ferme le fichier reçu avant l'envoi de la réponse : copie par blocs dans un fichier temporaire
+    upload_copy = tempfile.TemporaryFile()
+    shutil.copyfileobj(fichier.file, upload_copy)
+    upload_copy.seek(0)
+    text_stream = io.TextIOWrapper(upload_copy, encoding="utf-8-sig", newline="")
+    
+    def events_stream():
+        # Générateur synchrone : Starlette l'itère dans le threadpool, la boucle reste libre
+        try:
+            for event in importer.run(text_stream, kind):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            text_stream.close()
+    
+    response = StreamingResponse(events_stream(), media_type="application/x-ndjson")
+    return add_no_cache_headers(response)
+
 @app.post("/admin/update/{inc_id}")
-def update_status(
+async def update_status(
     request: Request, 
     inc_id: int, 
     new_status: str = Form(...), 
     admin_id: int = Form(...),
     commentaire: str = Form(None),
-    db: Session = Depends(database.get_db)
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    is_valid, _ = validate_session(request, admin_id)
-    if not is_valid:
+    if not is_authorized(principal, admin_id):
         return RedirectResponse(url="/", status_code=303)
-    
-    user = db.query(models.User).filter(models.User.id == admin_id).first()
-    if not user or user.role != "chef":
+    if principal["role"] != "chef":
         raise HTTPException(status_code=403, detail="Accès non autorisé")
+    if new_status not in counters.STATUTS:
+        raise HTTPException(status_code=400, detail="Statut inconnu")
     
-    inc = db.query(models.Incident).filter(models.Incident.id == inc_id).first()
+    # Ligne verrouillée (MySQL) jusqu'au commit : deux mises à jour simultanées ne lisent pas le même ancien statut
+    result = await db.execute(select(models.Incident).where(models.Incident.id == inc_id).with_for_update())
+    inc = result.scalar_one_or_none()
     if not inc:
         raise HTTPException(status_code=404, detail="Incident non trouvé")
     
     # Vérifier que l'incident appartient au département du chef
-    if inc.departement_id != user.chef_departement_id:
+    if inc.departement_id != principal["chef_departement_id"]:
         raise HTTPException(status_code=403, detail="Cet incident n'appartient pas à votre département")
     
-    inc.statut = new_status
+    old_statut = inc.statut
+    values = {"statut": new_status}
     if commentaire:
-        inc.commentaire_chef = commentaire
-    db.commit()
+        values["commentaire_chef"] = commentaire
+    # Condition sur l'ancien statut : sans verrou de ligne (SQLite), les compteurs ne bougent qu'une fois
+    result = await db.execute(
+        update(models.Incident)
+        .where(models.Incident.id == inc.id, models.Incident.statut == old_statut)
+        .values(**values)
+    )
+    if result.rowcount != 1:
+        raise HTTPException(status_code=409, detail="Incident modifié entre-temps, veuillez réessayer")
+    await counters.move(db, inc.departement_id, inc.type_inc, old_statut, new_status)
+    jobs.enqueue(db, "audit", {
+        "action": "statut", "incidents": [inc.id], "ancien": old_statut, "nouveau": new_status,
+        "par": principal["user_id"], "date": datetime.utcnow()
+    })
+    await db.commit()
+    publish_incident_event("incident-updated", inc)
     return RedirectResponse(url=f"/admin/{admin_id}", status_code=303)
 
+# Nombre maximal d'incidents modifiés par une mise à jour groupée
+MAX_BULK_UPDATE = 500
+
+@app.post("/admin/update-bulk")
+async def update_status_bulk(
+    request: Request,
+    admin_id: int = Form(...),
+    incident_ids: List[int] = Form(...),
+    new_status: str = Form(...),
+    commentaire: str = Form(None),
+    principal: dict = Depends(current_principal),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """Change le statut de plusieurs incidents en une seule transaction et détaille le résultat par incident"""
+    if not is_authorized(principal, admin_id):
+        return JSONResponse({"valid": False}, status_code=401)
+    if principal["role"] != "chef":
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    departement_id = principal["chef_departement_id"]
+    if new_status not in counters.STATUTS:
+        raise HTTPException(status_code=400, detail="Statut inconnu")
+    
+    incident_ids = list(dict.fromkeys(incident_ids))
+    if len(incident_ids) > MAX_BULK_UPDATE:
+        raise HTTPException(status_code=400, detail=f"Au plus {MAX_BULK_UPDATE} incidents par requête")
+    
+    # Une seule requête pour vérifier l'existence et l'appartenance au département
+    result = await db.execute(
+        select(models.Incident).where(models.Incident.id.in_(incident_ids)).with_for_update()
+    )
+    found = {inc.id: inc for inc in result.scalars()}
+    
+    results = {}
+    to_update = []
+    for inc_id in incident_ids:
+        inc = found.get(inc_id)
+        if not inc:
+            results[inc_id] = "introuvable"
+        elif inc.departement_id != departement_id:
+            results[inc_id] = "interdit"
+        else:
+            results[inc_id] = "modifie"
+            to_update.append(inc)
+    
+    if to_update:
+        values = {"statut": new_status}
+        if commentaire:
+            values["commentaire_chef"] = commentaire
+        # Nombre d'incidents déplacés par (type, ancien statut), pour les compteurs
+        moved = Counter()
+        if db.get_bind().dialect.name == "mysql":
+            # Lignes déjà verrouillées par le SELECT ... FOR UPDATE : un seul UPDATE ensembliste,
+            # les compteurs se déduisent des lignes lues
+            await db.execute(
+                update(models.Incident)
+                .where(models.Incident.id.in_([inc.id for inc in to_update]))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            moved.update((inc.type_inc, inc.statut) for inc in to_update)
+        else:
+            # SQLite ignore FOR UPDATE : une mise à jour par (type, ancien statut), conditionnée par
+            # l'ancien statut, pour ne compter que les lignes réellement modifiées
+            groups = {}
+            for inc in to_update:
+                groups.setdefault((inc.type_inc, inc.statut), []).append(inc)
+            for (type_inc, old_statut), group in groups.items():
+                ids = [inc.id for inc in group]
+                result = await db.execute(
+                    update(models.Incident)
+                    .where(
+                        models.Incident.id.in_(ids),
+                        models.Incident.departement_id == departement_id,
+                        models.Incident.statut == old_statut
+                    )
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                moved[(type_inc, old_statut)] += result.rowcount
+                if result.rowcount != len(ids):
+                    # Modifiés entre-temps par une autre requête
+                    changed = await db.execute(
+                        select(models.Incident.id).where(models.Incident.id.in_(ids), models.Incident.statut != new_status)
+                    )
+                    for inc_id in changed.scalars():
+                        results[inc_id] = "conflit"
+        for (type_inc, old_statut), count in moved.items():
+            if old_statut != new_status and count:
+                await counters.increment(db, departement_id, old_statut, type_inc, -count)
+                await counters.increment(db, departement_id, new_status, type_inc, count)
+        to_update = [inc for inc in to_update if results[inc.id] == "modifie"]
+    
+    if to_update:
+        # Objets en mémoire alignés sur la base, sans nouvelle écriture au commit (événements SSE)
+        for inc in to_update:
+            for key, value in values.items():
+                set_committed_value(inc, key, value)
+        jobs.enqueue(db, "audit", {
+            "action": "statut", "incidents": [inc.id for inc in to_update], "nouveau": new_status,
+            "par": principal["user_id"], "date": datetime.utcnow()
+        })
+        await db.commit()
+        publish_incidents_updated(to_update)
+    
+    return JSONResponse({
+        "statut": new_status,
+        "modifies": sum(1 for r in results.values() if r == "modifie"),
+        "resultats": [{"id": inc_id, "resultat": r} for inc_id, r in results.items()]
+    })
+
 # --- INSCRIPTION ---
 @app.get("/register", response_class=HTMLResponse)
-def get_register_page(request: Request, db: Session = Depends(database.get_db)):
-    departements = db.query(models.Departement).all()
+async def get_register_page(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    result = await db.execute(select(models.Departement))
+    departements = result.scalars().all()
     response = templates.TemplateResponse("register.html", {
         "request": request,
         "departements": departements
@@ -307,22 +751,24 @@ async def register(
     nom_complet: str = Form(...),
     email: str = Form(...),
     departement_id: int = Form(...),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    existing_user = db.query(models.User).filter(
+    result = await db.execute(select(models.User).where(
         (models.User.username == username) | (models.User.email == email)
-    ).first()
+    ))
+    existing_user = result.scalars().first()
     if existing_user:
         return RedirectResponse(url="/register?error=exists", status_code=303)
     
-    hashed_pwd = auth.get_password_hash(password)
+    hashed_pwd = await auth.get_password_hash_async(password)
     
     if role == "chef":
         # Vérifier qu'il n'y a pas déjà un chef pour ce département
-        existing_chef = db.query(models.User).filter(
+        result = await db.execute(select(models.User).where(
             models.User.chef_departement_id == departement_id,
             models.User.role == "chef"
-        ).first()
+        ))
+        existing_chef = result.scalars().first()
         if existing_chef:
             return RedirectResponse(url="/register?error=chef_exists", status_code=303)
         
@@ -345,51 +791,89 @@ async def register(
         )
     
     db.add(new_user)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/", status_code=303)
 
 # --- INITIALISATION ---
 @app.on_event("startup")
-def startup_db_setup():
-    db = database.SessionLocal()
-    
-    # Créer les départements s'ils n'existent pas
-    if not db.query(models.Departement).first():
-        dept_info = models.Departement(nom="Informatique", code="INFO")
-        dept_math = models.Departement(nom="Mathématiques", code="MATH")
-        dept_phy = models.Departement(nom="Physique", code="PHY")
-        dept_chi = models.Departement(nom="Chimie", code="CHI")
-        db.add_all([dept_info, dept_math, dept_phy, dept_chi])
-        db.commit()
-    
-    # Créer des utilisateurs de test
-    if not db.query(models.User).first():
-        dept_info = db.query(models.Departement).filter(models.Departement.code == "INFO").first()
-        
-        p = models.User(
-            username="prof1", 
-            hashed_password=auth.get_password_hash("123"), 
-            role="professeur",
-            nom_complet="Professeur Test",
-            email="prof1@fstt.ac.ma",
-            departement_id=dept_info.id
-        )
-        c = models.User(
-            username="chef1", 
-            hashed_password=auth.get_password_hash("123"), 
-            role="chef",
-            nom_complet="Chef Département Info",
-            email="chef1@fstt.ac.ma",
-            chef_departement_id=dept_info.id
-        )
-        db.add_all([p, c])
-        db.commit()
-    db.close()
+def start_session_sweeper():
+    session_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_session_sweeper():
+    session_sweeper.stop()
+
+@app.on_event("startup")
+def start_throttle_sweeper():
+    throttle_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_throttle_sweeper():
+    throttle_sweeper.stop()
+
+@app.on_event("shutdown")
+def stop_hashing_pool():
+    auth.hashing_pool.shutdown()
+    bulk_import.shutdown()
+
+@app.on_event("startup")
+def start_job_worker():
+    if JOBS_WORKER_IN_APP:
+        job_worker.start()
+
+@app.on_event("shutdown")
+def stop_job_worker():
+    job_worker.stop()
+
+@app.on_event("startup")
+def start_upload_sweeper():
+    if UPLOAD_GC_IN_APP:
+        upload_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_upload_sweeper():
+    upload_sweeper.stop()
+
+@app.on_event("shutdown")
+def stop_image_pipeline():
+    image_pipeline.shutdown()
+
+# Politique de cache par classe de routes :
+# - /uploads/ : noms UUID, le contenu d'une URL ne change jamais
+# - /static/ : noms fixes, mis en cache une semaine puis revalidés par ETag
+# - tout le reste (pages authentifiées, redirections, JSON) : jamais en cache
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = "public, max-age=604800"
 
 @app.middleware("http")
-async def add_security_headers(request: Request, call_next):
+async def add_cache_headers(request: Request, call_next):
     response = await call_next(request)
-    response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
\ No newline at end of file
+    path = request.url.path
+    # StaticFiles fournit déjà ETag/Last-Modified et répond 304 aux requêtes conditionnelles
+    if response.status_code in (200, 304) and path.startswith("/uploads/"):
+        response.headers["Cache-Control"] = UPLOAD_CACHE_CONTROL
+    elif response.status_code in (200, 304) and path.startswith("/static/"):
+        response.headers["Cache-Control"] = STATIC_CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
+    return response
+
+# Compression brotli (ou gzip selon Accept-Encoding) des pages HTML et réponses texte ;
+# les images, déjà compressées, les flux SSE et les exports (gzip à la demande) sont exclus
+app.add_middleware(BrotliMiddleware, minimum_size=1024, excluded_handlers=["^/uploads/", "^/static/", "^/events/", "^/admin/export/"])
+
+# Mesures par route (ajouté en dernier : englobe tous les autres middlewares)
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(auth.HashingPoolBusy)
+async def hashing_pool_busy_handler(request: Request, exc: auth.HashingPoolBusy):
+    response = JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+    return add_no_cache_headers(response)
+
+@app.exception_handler(throttle.LoginThrottled)
+async def login_throttled_handler(request: Request, exc: throttle.LoginThrottled):
+    response = RedirectResponse(url="/?error=2", status_code=303)
+    response.headers["Retry-After"] = str(int(exc.retry_after) + 1)
+    return add_no_cache_headers(response)
@@ -0,0 +1,184 @@
+"""Commandes d'administration, hors du démarrage de l'application.
+
+Usage :
+    python manage.py migrate              applique les migrations (migrations/versions)
+    python manage.py migrate --revision 0001
+    python manage.py seed-demo            crée les départements et les comptes de démonstration
+    python manage.py import utilisateurs profs.csv --erreurs rejets.csv
+    python manage.py import incidents historique.csv
+    python manage.py worker               exécute les tâches d'arrière-plan (voir jobs.py)
+    python manage.py worker --types miniatures --types audit
+    python manage.py jobs-retry           remet en file les tâches en échec
+    python manage.py sessions-revoke prof1  ferme les sessions d'un compte (droits modifiés hors ORM)
+"""
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+
+def alembic_config(url: str = None):
+    from alembic.config import Config
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    if url:
+        config.set_main_option("sqlalchemy.url", url)
+    return config
+
+def migrate(url: str = None, revision: str = "head"):
+    """Met le schéma à jour jusqu'à `revision`"""
+    from alembic import command
+    command.upgrade(alembic_config(url), revision)
+
+def seed_demo():
+    """Départements et comptes prof1 / chef1 (mot de passe "123"), s'ils n'existent pas"""
+    import auth
+    import database
+    import models
+
+    db = database.SessionLocal()
+    try:
+        # Créer les départements s'ils n'existent pas
+        if not db.query(models.Departement).first():
+            dept_info = models.Departement(nom="Informatique", code="INFO")
+            dept_math = models.Departement(nom="Mathématiques", code="MATH")
+            dept_phy = models.Departement(nom="Physique", code="PHY")
+            dept_chi = models.Departement(nom="Chimie", code="CHI")
+            db.add_all([dept_info, dept_math, dept_phy, dept_chi])
+            db.commit()
+
+        # Créer des utilisateurs de test
+        if not db.query(models.User).first():
+            dept_info = db.query(models.Departement).filter(models.Departement.code == "INFO").first()
+            hashed = auth.get_password_hash("123")
+
+            p = models.User(
+                username="prof1",
+                hashed_password=hashed,
+                role="professeur",
+                nom_complet="Professeur Test",
+                email="prof1@fstt.ac.ma",
+                departement_id=dept_info.id
+            )
+            c = models.User(
+                username="chef1",
+                hashed_password=hashed,
+                role="chef",
+                nom_complet="Chef Département Info",
+                email="chef1@fstt.ac.ma",
+                chef_departement_id=dept_info.id
+            )
+            db.add_all([p, c])
+            db.commit()
+            print("✅ Comptes de démonstration créés : prof1 / chef1 (mot de passe 123)")
+        else:
+            print("Des utilisateurs existent déjà, rien à créer")
+    finally:
+        db.close()
+
+def import_csv(kind: str, path: str, errors_path: str = None, chunk_size: int = None):
+    """Importe un CSV (voir bulk_import.py), affiche l'avancement et écrit les lignes rejetées"""
+    import bulk_import
+    import database
+
+    importer = bulk_import.Importer(database.engine, chunk_size=chunk_size or bulk_import.IMPORT_CHUNK_SIZE)
+    errors_file = open(errors_path, "w", newline="", encoding="utf-8") if errors_path else None
+    errors_writer = csv.writer(errors_file or sys.stdout)
+    summary = None
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for event in importer.run(f, kind):
+                if event["type"] == "erreur":
+                    errors_writer.writerow([event["ligne"], event["erreur"]])
+                elif event["type"] == "avancement":
+                    print(f"{event['lignes']} lignes, {event['inserees']} insérées, "
+                          f"{event['rejetees']} rejetées ({event['secondes']} s)", file=sys.stderr)
+                else:
+                    summary = event
+    finally:
+        bulk_import.shutdown()
+        if errors_file:
+            errors_file.close()
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return summary
+
+def run_worker(types=None):
+    """Exécute les tâches d'arrière-plan jusqu'à Ctrl-C"""
+    import threading
+    import database
+    import jobs
+    import metrics
+    import tasks
+
+    # Journal d'audit et erreurs des tâches, comme dans l'application
+    metrics.configure_logging()
+    worker = jobs.JobWorker(database.engine, types=types)
+    worker.start()
+    print(f"Worker de tâches démarré ({', '.join(t.name for t in worker.types)})", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+        tasks.image_pipeline.shutdown()
+
+def retry_jobs(job_type: str = None):
+    """Remet en file les tâches en échec"""
+    import database
+    import jobs
+
+    print(f"{jobs.retry_failed(database.engine, job_type)} tâche(s) remise(s) en file", file=sys.stderr)
+
+def revoke_sessions(username: str):
+    """Ferme les sessions d'un compte dont les droits ont été modifiés sans passer par l'ORM"""
+    from sqlalchemy import select
+    import database
+    import models
+    import sessions
+
+    with database.SessionLocal() as db:
+        user_id = db.execute(select(models.User.id).where(models.User.username == username)).scalar()
+    if user_id is None:
+        print(f"Utilisateur inconnu : {username}", file=sys.stderr)
+        return False
+    if not isinstance(sessions.shared_backend(), sessions.SQLiteSessionBackend):
+        print("SESSION_BACKEND=memory : les sessions de l'application ne sont pas visibles d'ici", file=sys.stderr)
+    print(f"{len(sessions.invalidate_user(user_id))} session(s) fermée(s)", file=sys.stderr)
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Administration de l'application incidents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="appliquer les migrations du schéma")
+    migrate_parser.add_argument("--revision", default="head")
+    migrate_parser.add_argument("--url", help="base cible (par défaut DATABASE_URL)")
+    subparsers.add_parser("seed-demo", help="créer les données de démonstration")
+    import_parser = subparsers.add_parser("import", help="importer des utilisateurs ou des incidents depuis un CSV")
+    import_parser.add_argument("kind", choices=("utilisateurs", "incidents"))
+    import_parser.add_argument("path")
+    import_parser.add_argument("--erreurs", help="fichier CSV des lignes rejetées (par défaut : sortie standard)")
+    import_parser.add_argument("--lot", type=int, help="lignes par transaction")
+    worker_parser = subparsers.add_parser("worker", help="exécuter les tâches d'arrière-plan")
+    worker_parser.add_argument("--types", action="append", help="types de tâches à traiter (par défaut : tous)")
+    retry_parser = subparsers.add_parser("jobs-retry", help="remettre en file les tâches en échec")
+    retry_parser.add_argument("--type", dest="job_type")
+    revoke_parser = subparsers.add_parser("sessions-revoke", help="fermer les sessions d'un compte")
+    revoke_parser.add_argument("username")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.url, args.revision)
+    elif args.command == "seed-demo":
+        seed_demo()
+    elif args.command == "import":
+        summary = import_csv(args.kind, args.path, args.erreurs, args.lot)
+        sys.exit(1 if summary is None or summary.get("erreur") else 0)
+    elif args.command == "worker":
+        run_worker(args.types)
+    elif args.command == "jobs-retry":
+        retry_jobs(args.job_type)
+    elif args.command == "sessions-revoke":
+        sys.exit(0 if revoke_sessions(args.username) else 1)
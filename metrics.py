@@ -0,0 +1,241 @@
+"""Métriques de l'application au format texte Prometheus.
+
+- latence et nombre de réponses par route (middleware ASGI) ;
+- nombre et durée des requêtes SQL attribués à la requête HTTP en cours
+  (événements before/after_cursor_execute de SQLAlchemy) ;
+- temps de rendu des templates Jinja, mesuré à part.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Proportion des événements de connexion écrits dans les logs
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+# Niveau du logger "incidents" (connexions échantillonnées, audit, erreurs des threads de fond)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+def _labels_text(labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels_text(key)} {value}"
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [compteurs par borne..., somme, nombre]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            for i, bound in enumerate(self.buckets):
+                yield f"{self.name}_bucket{_labels_text(key + (('le', bound),))} {series[i]}"
+            yield f"{self.name}_bucket{_labels_text(key + (('le', '+Inf'),))} {series[-1]}"
+            yield f"{self.name}_sum{_labels_text(key)} {series[-2]}"
+            yield f"{self.name}_count{_labels_text(key)} {series[-1]}"
+
+class Gauge:
+    """Jauge calculée au moment de l'export"""
+    def __init__(self, name: str, help_text: str, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.read()}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes HTTP par route"
+))
+http_requests = registry.register(Counter(
+    "http_requests_total", "Nombre de réponses HTTP par route et code de statut"
+))
+http_request_sql_statements = registry.register(Histogram(
+    "http_request_sql_statements", "Nombre de requêtes SQL exécutées par requête HTTP", STATEMENT_BUCKETS
+))
+sql_statement_duration = registry.register(Counter(
+    "sql_statement_seconds_total", "Temps passé dans les requêtes SQL par route"
+))
+template_render_duration = registry.register(Histogram(
+    "template_render_seconds", "Temps de rendu des templates Jinja"
+))
+
+class RequestStats:
+    """Compteurs SQL de la requête HTTP en cours"""
+    __slots__ = ("statements", "sql_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+_current_request = contextvars.ContextVar("current_request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = _current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += time.perf_counter() - start
+
+def instrument_engine(engine):
+    """Attribue les requêtes SQL du moteur à la requête HTTP en cours"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, statut et activité SQL de chaque requête, par modèle de route"""
+    def __init__(self, app, excluded_prefixes=("/events/",)):
+        self.app = app
+        self.excluded_prefixes = excluded_prefixes
+        self._route_paths = None
+
+    def _route_label(self, scope) -> str:
+        router = scope.get("router")
+        if self._route_paths is None and router is not None:
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path for route in router.routes
+            }
+        endpoint = scope.get("endpoint")
+        if endpoint is not None and self._route_paths and endpoint in self._route_paths:
+            return self._route_paths[endpoint]
+        # Fichiers statiques montés : un seul libellé par point de montage
+        path = scope["path"]
+        for prefix in ("/static/", "/uploads/"):
+            if path.startswith(prefix):
+                return prefix + "*"
+        return "non_routee"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            route = self._route_label(scope)
+            method = scope["method"]
+            http_request_duration.observe(elapsed, route=route, method=method)
+            http_requests.inc(route=route, method=method, status=status)
+            http_request_sql_statements.observe(stats.statements, route=route, method=method)
+            sql_statement_duration.inc(stats.sql_seconds, route=route, method=method)
+
+class InstrumentedTemplates(Jinja2Templates):
+    """Jinja2Templates qui mesure le temps de rendu de chaque page et de chaque fragment"""
+    def TemplateResponse(self, name, context, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().TemplateResponse(name, context, *args, **kwargs)
+        finally:
+            template_render_duration.observe(time.perf_counter() - start, template=name)
+
+    def render(self, name: str, **context) -> str:
+        """Rend un fragment (ex: ligne de tableau) hors réponse, mesuré sous son propre nom"""
+        start = time.perf_counter()
+        try:
+            return self.get_template(name).render(**context)
+        finally:
+            template_render_duration.observe(time.perf_counter() - start, template=name)
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Envoie le logger "incidents" et ses enfants sur la sortie d'erreur, une seule fois par processus"""
+    logger = logging.getLogger("incidents")
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        # Pas de doublon si la racine est aussi configurée (uvicorn --log-config, etc.)
+        logger.propagate = False
+    return logger
+
+def log_sampled(logger: logging.Logger, event_name: str, rate: float = None, **fields):
+    """Écrit un log JSON d'une ligne pour une fraction `rate` des appels"""
+    if random.random() >= (LOG_SAMPLE_RATE if rate is None else rate):
+        return
+    logger.info(json.dumps({"event": event_name, **fields}, ensure_ascii=False, default=str))
@@ -0,0 +1,42 @@
+"""Environnement Alembic : base de l'application (ou URL passée par manage.py) et métadonnées des modèles"""
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+import database
+import models
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Ignore à l'autogénération l'index FTS5 de SQLite, géré à la main (voir 0002)"""
+    if type_ == "table" and name.startswith("incidents_fts"):
+        return False
+    if type_ == "index" and name == "ft_incidents_texte" and context.get_context().dialect.name != "mysql":
+        return False
+    return True
+
+def database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or database.URL_DATABASE
+
+def run_migrations_offline():
+    """Génère le SQL sans se connecter (alembic upgrade head --sql)"""
+    context.configure(url=database_url(), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    engine = create_engine(database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,64 @@
+"""Schéma initial : départements, utilisateurs et incidents
+
+Correspond aux tables créées jusqu'ici par create_all. Pour une base
+existante, marquer cette révision comme appliquée avant de migrer :
+    alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "departements",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nom", sa.String(100)),
+        sa.Column("code", sa.String(10)),
+        sa.UniqueConstraint("code"),
+    )
+    op.create_index("ix_departements_id", "departements", ["id"])
+    op.create_index("ix_departements_nom", "departements", ["nom"], unique=True)
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(50)),
+        sa.Column("hashed_password", sa.String(255)),
+        sa.Column("role", sa.String(20)),
+        sa.Column("nom_complet", sa.String(100)),
+        sa.Column("email", sa.String(100)),
+        sa.Column("departement_id", sa.Integer(), sa.ForeignKey("departements.id"), nullable=True),
+        sa.Column("chef_departement_id", sa.Integer(), sa.ForeignKey("departements.id"), nullable=True),
+        sa.UniqueConstraint("email"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "incidents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("type_inc", sa.String(100)),
+        sa.Column("salle", sa.String(50)),
+        sa.Column("description", sa.String(500)),
+        sa.Column("image_path", sa.String(255), nullable=True),
+        sa.Column("statut", sa.String(50)),
+        sa.Column("date_creation", sa.DateTime()),
+        sa.Column("date_modification", sa.DateTime()),
+        sa.Column("prof_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("departement_id", sa.Integer(), sa.ForeignKey("departements.id")),
+        sa.Column("commentaire_chef", sa.String(500), nullable=True),
+    )
+    op.create_index("ix_incidents_id", "incidents", ["id"])
+
+def downgrade():
+    op.drop_table("incidents")
+    op.drop_table("users")
+    op.drop_table("departements")
@@ -0,0 +1,78 @@
+"""Index des tableaux de bord, recherche plein texte et compteurs par département
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Copie figée de search.SQLITE_FTS_DDL : une migration ne doit pas changer si le module évolue
+SQLITE_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS incidents_fts USING fts5(
+        description, type_inc, salle,
+        content='incidents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_insert AFTER INSERT ON incidents BEGIN
+        INSERT INTO incidents_fts (rowid, description, type_inc, salle)
+        VALUES (new.id, new.description, new.type_inc, new.salle);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_delete AFTER DELETE ON incidents BEGIN
+        INSERT INTO incidents_fts (incidents_fts, rowid, description, type_inc, salle)
+        VALUES ('delete', old.id, old.description, old.type_inc, old.salle);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_update AFTER UPDATE OF description, type_inc, salle ON incidents BEGIN
+        INSERT INTO incidents_fts (incidents_fts, rowid, description, type_inc, salle)
+        VALUES ('delete', old.id, old.description, old.type_inc, old.salle);
+        INSERT INTO incidents_fts (rowid, description, type_inc, salle)
+        VALUES (new.id, new.description, new.type_inc, new.salle);
+    END""",
+)
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    # Pagination par clé (date_creation, id) des tableaux de bord chef et professeur
+    op.create_index("ix_incidents_departement_date", "incidents", ["departement_id", "date_creation"])
+    op.create_index("ix_incidents_prof_date", "incidents", ["prof_id", "date_creation"])
+
+    if dialect == "mysql":
+        op.create_index("ft_incidents_texte", "incidents", ["description", "type_inc", "salle"], mysql_prefix="FULLTEXT")
+    elif dialect == "sqlite":
+        for ddl in SQLITE_FTS_DDL:
+            op.execute(ddl)
+        op.execute("INSERT INTO incidents_fts (incidents_fts) VALUES ('rebuild')")
+
+    op.create_table(
+        "incident_counters",
+        sa.Column("departement_id", sa.Integer(), sa.ForeignKey("departements.id"), nullable=False),
+        sa.Column("statut", sa.String(50), nullable=False),
+        sa.Column("type_inc", sa.String(100), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("departement_id", "statut", "type_inc"),
+    )
+    # Compteurs initiaux calculés depuis les incidents déjà présents
+    op.execute(
+        "INSERT INTO incident_counters (departement_id, statut, type_inc, total)"
+        " SELECT departement_id, statut, type_inc, COUNT(id) FROM incidents"
+        " WHERE departement_id IS NOT NULL AND statut IS NOT NULL AND type_inc IS NOT NULL"
+        " GROUP BY departement_id, statut, type_inc"
+    )
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    op.drop_table("incident_counters")
+    if dialect == "mysql":
+        op.drop_index("ft_incidents_texte", table_name="incidents")
+    elif dialect == "sqlite":
+        for name in ("incidents_fts_insert", "incidents_fts_delete", "incidents_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS incidents_fts")
+    op.drop_index("ix_incidents_prof_date", table_name="incidents")
+    op.drop_index("ix_incidents_departement_date", table_name="incidents")
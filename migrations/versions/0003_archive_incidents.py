@@ -0,0 +1,38 @@
+"""Table d'archive des incidents terminés (voir archive.py)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "incidents_archive",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("type_inc", sa.String(100)),
+        sa.Column("salle", sa.String(50)),
+        sa.Column("description", sa.String(500)),
+        sa.Column("image_path", sa.String(255), nullable=True),
+        sa.Column("statut", sa.String(50)),
+        sa.Column("date_creation", sa.DateTime()),
+        sa.Column("date_modification", sa.DateTime()),
+        sa.Column("prof_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("departement_id", sa.Integer(), sa.ForeignKey("departements.id")),
+        sa.Column("commentaire_chef", sa.String(500), nullable=True),
+        sa.Column("date_archivage", sa.DateTime()),
+    )
+    op.create_index("ix_incidents_archive_departement_date", "incidents_archive", ["departement_id", "date_creation"])
+    op.create_index("ix_incidents_archive_prof_date", "incidents_archive", ["prof_id", "date_creation"])
+    # Sélection des lots à archiver : incidents terminés, du plus ancien au plus récent
+    op.create_index("ix_incidents_statut_modification", "incidents", ["statut", "date_modification"])
+
+def downgrade():
+    op.drop_index("ix_incidents_statut_modification", table_name="incidents")
+    op.drop_table("incidents_archive")
@@ -0,0 +1,37 @@
+"""File de tâches d'arrière-plan (outbox transactionnelle, voir jobs.py)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("type", sa.String(50), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("statut", sa.String(20), nullable=False),
+        sa.Column("coalesce_key", sa.String(100), nullable=True),
+        sa.Column("tentatives", sa.Integer(), nullable=False),
+        sa.Column("max_tentatives", sa.Integer(), nullable=False),
+        sa.Column("executer_apres", sa.DateTime(), nullable=False),
+        sa.Column("bail_jeton", sa.String(36), nullable=True),
+        sa.Column("bail_expire", sa.DateTime(), nullable=True),
+        sa.Column("derniere_erreur", sa.String(1000), nullable=True),
+        sa.Column("date_creation", sa.DateTime()),
+        sa.Column("date_fin", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_jobs_statut_type_executer", "jobs", ["statut", "type", "executer_apres"])
+    op.create_index("ix_jobs_coalesce", "jobs", ["coalesce_key", "statut"])
+    op.create_index("ix_jobs_bail_jeton", "jobs", ["bail_jeton"])
+
+def downgrade():
+    op.drop_table("jobs")
@@ -0,0 +1,30 @@
+"""Stockage des photos par contenu et comptage des références (voir upload_store.py)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "fichiers",
+        sa.Column("chemin", sa.String(255), primary_key=True),
+        sa.Column("nb_references", sa.Integer(), nullable=False),
+        sa.Column("date_creation", sa.DateTime()),
+        sa.Column("date_liberation", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_fichiers_liberation", "fichiers", ["nb_references", "date_liberation"])
+    op.create_index("ix_incidents_image_path", "incidents", ["image_path"])
+    op.create_index("ix_incidents_archive_image_path", "incidents_archive", ["image_path"])
+
+def downgrade():
+    op.drop_index("ix_incidents_archive_image_path", table_name="incidents_archive")
+    op.drop_index("ix_incidents_image_path", table_name="incidents")
+    op.drop_table("fichiers")
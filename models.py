@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
+import sessions
 
 class Departement(Base):
     __tablename__ = "departements"
@@ -34,6 +35,10 @@ class User(Base):
     # Incidents créés par ce professeur
     incidents = relationship("Incident", back_populates="professeur", foreign_keys="Incident.prof_id")
 
+# Le principal en cache dans les sessions ne doit jamais survivre à un changement de droits,
+# quel que soit le processus qui le fait (application, manage.py, scripts)
+sessions.watch_principal_changes(User)
+
 class Incident(Base):
     __tablename__ = "incidents"
     id = Column(Integer, primary_key=True, index=True)
@@ -53,4 +58,93 @@ class Incident(Base):
     departement = relationship("Departement", back_populates="incidents")
     
     # Commentaires du chef (optionnel)
-    commentaire_chef = Column(String(500), nullable=True)
\ No newline at end of file
+    commentaire_chef = Column(String(500), nullable=True)
+    
+    # Index composites pour la pagination par clé (date_creation, id) des tableaux de bord :
+    # InnoDB ajoute la clé primaire à chaque index secondaire, une page est donc un simple parcours d'intervalle
+    __table_args__ = (
+        Index("ix_incidents_departement_date", "departement_id", "date_creation"),
+        Index("ix_incidents_prof_date", "prof_id", "date_creation"),
+        # Sélection des incidents terminés à archiver (archive.py)
+        Index("ix_incidents_statut_modification", "statut", "date_modification"),
+        # Vérification des références aux photos avant suppression (upload_store.py)
+        Index("ix_incidents_image_path", "image_path"),
+        # Recherche plein texte (MySQL) ; sous SQLite, voir la table FTS5 de search.py
+        Index("ft_incidents_texte", "description", "type_inc", "salle", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+class IncidentCounter(Base):
+    """Nombre d'incidents par département, statut et type, tenu à jour avec chaque écriture"""
+    __tablename__ = "incident_counters"
+    departement_id = Column(Integer, ForeignKey("departements.id"), nullable=False)
+    statut = Column(String(50), nullable=False)
+    type_inc = Column(String(100), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        PrimaryKeyConstraint("departement_id", "statut", "type_inc"),
+    )
+class IncidentArchive(Base):
+    """Incidents terminés depuis longtemps, déplacés hors de la table active par archive.py"""
+    __tablename__ = "incidents_archive"
+    id = Column(Integer, primary_key=True)  # Même identifiant que dans la table incidents
+    type_inc = Column(String(100))
+    salle = Column(String(50))
+    description = Column(String(500))
+    image_path = Column(String(255), nullable=True)
+    statut = Column(String(50))
+    date_creation = Column(DateTime)
+    date_modification = Column(DateTime)
+    prof_id = Column(Integer, ForeignKey("users.id"))
+    departement_id = Column(Integer, ForeignKey("departements.id"))
+    commentaire_chef = Column(String(500), nullable=True)
+    date_archivage = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # Lecture seule : un incident archivé ne se modifie plus
+    professeur = relationship("User", foreign_keys=[prof_id], viewonly=True)
+    departement = relationship("Departement", viewonly=True)
+    
+    # Mêmes index que la table active pour la vue historique paginée
+    __table_args__ = (
+        Index("ix_incidents_archive_departement_date", "departement_id", "date_creation"),
+        Index("ix_incidents_archive_prof_date", "prof_id", "date_creation"),
+        Index("ix_incidents_archive_image_path", "image_path"),
+    )
+
+class Job(Base):
+    """Tâche d'arrière-plan (outbox transactionnelle), écrite dans la même transaction que l'incident"""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    type = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    statut = Column(String(20), nullable=False, default="en_attente")  # en_attente, en_cours, termine, echec
+    # Tâches regroupées en une seule exécution (ex: notifications d'un même chef)
+    coalesce_key = Column(String(100), nullable=True)
+    tentatives = Column(Integer, nullable=False, default=0)
+    max_tentatives = Column(Integer, nullable=False, default=5)
+    executer_apres = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # Bail du worker qui exécute la tâche ; expiré, la tâche peut être reprise par un autre
+    bail_jeton = Column(String(36), nullable=True)
+    bail_expire = Column(DateTime, nullable=True)
+    derniere_erreur = Column(String(1000), nullable=True)
+    date_creation = Column(DateTime, default=datetime.datetime.utcnow)
+    date_fin = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_jobs_statut_type_executer", "statut", "type", "executer_apres"),
+        Index("ix_jobs_coalesce", "coalesce_key", "statut"),
+        Index("ix_jobs_bail_jeton", "bail_jeton"),
+    )
+
+class Fichier(Base):
+    """Photo stockée sous /uploads/ab/cd/<sha256>.<ext> et nombre d'incidents qui la référencent"""
+    __tablename__ = "fichiers"
+    chemin = Column(String(255), primary_key=True)  # Même valeur que Incident.image_path
+    nb_references = Column(Integer, nullable=False, default=0)
+    date_creation = Column(DateTime, default=datetime.datetime.utcnow)
+    # Date à laquelle le fichier n'a plus été référencé ; supprimé après un délai de grâce
+    date_liberation = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_fichiers_liberation", "nb_references", "date_liberation"),
+    )
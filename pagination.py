@@ -0,0 +1,92 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+import models
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def clamp_page_size(limit) -> int:
+    """Borne la taille de page demandée par le client"""
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def encode_cursor(incident) -> str:
+    """Encode la position (date_creation, id) d'un incident en curseur opaque"""
+    raw = f"{incident.date_creation.isoformat()}|{incident.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Décode un curseur, retourne None s'il est absent ou invalide"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        date_str, inc_id = raw.split("|")
+        return datetime.fromisoformat(date_str), int(inc_id)
+    except (ValueError, UnicodeError):
+        return None
+
+class IncidentPage:
+    """Une page d'incidents avec les curseurs vers les pages voisines"""
+    def __init__(self, items, page_size, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+def _before(model, position):
+    date_creation, inc_id = position
+    return or_(
+        model.date_creation < date_creation,
+        and_(model.date_creation == date_creation, model.id < inc_id)
+    )
+
+def _after(model, position):
+    date_creation, inc_id = position
+    return or_(
+        model.date_creation > date_creation,
+        and_(model.date_creation == date_creation, model.id > inc_id)
+    )
+
+async def paginate_incidents(db, stmt, cursor: str = None, direction: str = "next", limit: int = None,
+                             model=models.Incident) -> IncidentPage:
+    """Pagination par clé (keyset) sur (date_creation, id), du plus récent au plus ancien.
+
+    `stmt` est un select(model) non trié (models.Incident ou
+    models.IncidentArchive) : l'ordre est imposé ici pour correspondre aux
+    index composites des deux tables.
+    """
+    page_size = clamp_page_size(limit)
+    position = decode_cursor(cursor)
+
+    if position and direction == "prev":
+        result = await db.execute(stmt.where(_after(model, position)).order_by(
+            model.date_creation.asc(), model.id.asc()
+        ).limit(page_size + 1))
+        rows = result.scalars().unique().all()
+        has_more = len(rows) > page_size
+        rows = list(reversed(rows[:page_size]))
+        if not rows:
+            return await paginate_incidents(db, stmt, limit=page_size, model=model)
+        return IncidentPage(
+            rows, page_size,
+            next_cursor=encode_cursor(rows[-1]),
+            prev_cursor=encode_cursor(rows[0]) if has_more else None
+        )
+
+    if position:
+        stmt = stmt.where(_before(model, position))
+    result = await db.execute(stmt.order_by(
+        model.date_creation.desc(), model.id.desc()
+    ).limit(page_size + 1))
+    rows = result.scalars().unique().all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return IncidentPage(
+        rows, page_size,
+        next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        prev_cursor=encode_cursor(rows[0]) if position and rows else None
+    )
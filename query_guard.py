@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+class QueryBudgetExceeded(AssertionError):
+    """Levée quand une portion de code exécute plus de requêtes SQL que prévu"""
+
+class QueryCounter:
+    """Compte les requêtes SQL exécutées sur un moteur via les événements SQLAlchemy"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def start(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def stop(self):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+@contextmanager
+def count_queries(engine):
+    """Compte les requêtes exécutées dans le bloc"""
+    counter = QueryCounter(engine).start()
+    try:
+        yield counter
+    finally:
+        counter.stop()
+
+@contextmanager
+def assert_max_queries(engine, budget: int):
+    """Échoue si le bloc exécute plus de `budget` requêtes SQL.
+
+    Pour les routes asynchrones, passer le moteur synchrone sous-jacent :
+        with assert_max_queries(database.async_engine.sync_engine, 3):
+            client.get(f"/admin/{chef.id}")
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        detail = "\n".join(f"  {i + 1}. {stmt}" for i, stmt in enumerate(counter.statements))
+        raise QueryBudgetExceeded(
+            f"{counter.count} requêtes exécutées pour un budget de {budget} :\n{detail}"
+        )
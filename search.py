@@ -0,0 +1,136 @@
+"""Recherche plein texte sur la description, le type et la salle des incidents.
+
+MySQL utilise l'index FULLTEXT déclaré sur models.Incident ; pour les
+essais locaux sous SQLite, une table virtuelle FTS5 synchronisée par
+triggers joue le même rôle. Dans les deux cas les résultats sont classés
+par pertinence et limités au département demandé.
+"""
+import re
+from sqlalchemy import DateTime, bindparam, select, text
+from sqlalchemy.orm import joinedload
+import models
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Table FTS5 « external content » : le texte reste dans incidents, seul l'index est dupliqué
+SQLITE_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS incidents_fts USING fts5(
+        description, type_inc, salle,
+        content='incidents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_insert AFTER INSERT ON incidents BEGIN
+        INSERT INTO incidents_fts (rowid, description, type_inc, salle)
+        VALUES (new.id, new.description, new.type_inc, new.salle);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_delete AFTER DELETE ON incidents BEGIN
+        INSERT INTO incidents_fts (incidents_fts, rowid, description, type_inc, salle)
+        VALUES ('delete', old.id, old.description, old.type_inc, old.salle);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS incidents_fts_update AFTER UPDATE OF description, type_inc, salle ON incidents BEGIN
+        INSERT INTO incidents_fts (incidents_fts, rowid, description, type_inc, salle)
+        VALUES ('delete', old.id, old.description, old.type_inc, old.salle);
+        INSERT INTO incidents_fts (rowid, description, type_inc, salle)
+        VALUES (new.id, new.description, new.type_inc, new.salle);
+    END""",
+)
+
+def ensure_index(engine):
+    """Crée l'index plein texte SQLite s'il manque (MySQL : index FULLTEXT du modèle)"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'incidents_fts'"
+        )).first()
+        for ddl in SQLITE_FTS_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            conn.execute(text("INSERT INTO incidents_fts (incidents_fts) VALUES ('rebuild')"))
+
+def drop_index(engine):
+    """Supprime la table FTS5 (avant de recréer `incidents`, l'index deviendrait incohérent)"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS incidents_fts"))
+
+def tokenize(query: str):
+    """Mots de la recherche, sans la syntaxe propre à chaque moteur"""
+    return re.findall(r"\w+", query or "")
+
+def _sqlite_match(tokens) -> str:
+    # Tous les mots sont requis ; le dernier est un préfixe (recherche pendant la frappe)
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def _mysql_match(tokens) -> str:
+    return " ".join(f"+{token}*" for token in tokens)
+
+async def search_incidents(db, departement_id: int, query: str, statut: str = None,
+                           date_from=None, date_to=None, page: int = 1, limit: int = DEFAULT_LIMIT):
+    """Retourne (incidents classés par pertinence, il_existe_une_page_suivante)"""
+    tokens = tokenize(query)
+    if not tokens:
+        return [], False
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    page = max(page or 1, 1)
+
+    params = {
+        "departement_id": departement_id,
+        "limit": limit + 1,
+        "offset": (page - 1) * limit,
+    }
+    filters = ["i.departement_id = :departement_id"]
+    if statut:
+        filters.append("i.statut = :statut")
+        params["statut"] = statut
+    if date_from:
+        filters.append("i.date_creation >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        filters.append("i.date_creation < :date_to")
+        params["date_to"] = date_to
+
+    if db.get_bind().dialect.name == "mysql":
+        params["match"] = _mysql_match(tokens)
+        sql = (
+            "SELECT i.id, MATCH (i.description, i.type_inc, i.salle) AGAINST (:match IN BOOLEAN MODE) AS score"
+            " FROM incidents i"
+            " WHERE MATCH (i.description, i.type_inc, i.salle) AGAINST (:match IN BOOLEAN MODE)"
+            f" AND {' AND '.join(filters)}"
+            " ORDER BY score DESC, i.id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["match"] = _sqlite_match(tokens)
+        # bm25() est négatif : plus petit = plus pertinent
+        sql = (
+            "SELECT i.id, -bm25(incidents_fts) AS score"
+            " FROM incidents_fts JOIN incidents i ON i.id = incidents_fts.rowid"
+            " WHERE incidents_fts MATCH :match"
+            f" AND {' AND '.join(filters)}"
+            " ORDER BY bm25(incidents_fts), i.id DESC LIMIT :limit OFFSET :offset"
+        )
+
+    stmt = text(sql)
+    # Typer les dates pour qu'elles soient comparées au format de stockage du moteur
+    for name in ("date_from", "date_to"):
+        if name in params:
+            stmt = stmt.bindparams(bindparam(name, type_=DateTime))
+    rows = (await db.execute(stmt, params)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], False
+
+    # Charger les incidents de la page en une requête, puis rétablir l'ordre de pertinence
+    ids = [row.id for row in rows]
+    result = await db.execute(
+        select(models.Incident).options(
+            joinedload(models.Incident.professeur)
+        ).where(models.Incident.id.in_(ids))
+    )
+    by_id = {inc.id: inc for inc in result.scalars().unique()}
+    return [by_id[inc_id] for inc_id in ids if inc_id in by_id], has_more
@@ -0,0 +1,144 @@
+"""Générateur de données synthétiques pour les benchmarks.
+
+Remplit une base (SQLite locale par défaut, ou une base MySQL jetable)
+avec des départements, des professeurs, un chef par département et
+autant d'incidents que demandé, par insertions groupées (executemany).
+Tous les comptes ont le mot de passe "123".
+
+Usage :
+    python seed_data.py --url sqlite:///bench.db --departements 8 --profs 40 --incidents 1000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+import auth
+import counters
+import models
+import search
+
+TYPES = ("Vidéoprojecteur", "Climatisation", "Ordinateur", "Connexion Internet", "Tableau", "Éclairage", "Mobilier", "Autre")
+DESCRIPTIONS = (
+    "Le projecteur ne s'allume plus",
+    "Image floue sur le vidéoprojecteur",
+    "Climatisation bruyante et inefficace",
+    "Poste sans connexion réseau",
+    "Tableau abîmé, impossible d'écrire",
+    "Néons qui clignotent",
+    "Chaises cassées au fond de la salle",
+    "Prise électrique hors service",
+)
+STATUT_WEIGHTS = (("Terminé", 70), ("En cours", 10), ("En attente", 20))
+
+def chef_username(dept_index: int) -> str:
+    return f"chef{dept_index}"
+
+def prof_username(dept_index: int, prof_index: int) -> str:
+    return f"prof{dept_index}_{prof_index}"
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def seed(url: str, departements: int, profs: int, incidents: int, batch_size: int = 10000, seed_value: int = 42):
+    rng = random.Random(seed_value)
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    # La table FTS5 n'est pas dans les métadonnées : la supprimer pour que ensure_index la reconstruise
+    search.drop_index(engine)
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    timings = {}
+
+    start = time.perf_counter()
+    hashed = auth.get_password_hash("123")
+    dept_rows = [{"id": d, "nom": f"Département {d}", "code": f"D{d}"} for d in range(1, departements + 1)]
+    user_rows = []
+    prof_ids = {}
+    next_id = 1
+    for d in range(1, departements + 1):
+        user_rows.append({
+            "id": next_id, "username": chef_username(d), "hashed_password": hashed, "role": "chef",
+            "nom_complet": f"Chef {d}", "email": f"{chef_username(d)}@fstt.ac.ma",
+            "departement_id": None, "chef_departement_id": d
+        })
+        next_id += 1
+        prof_ids[d] = []
+        for p in range(1, profs + 1):
+            user_rows.append({
+                "id": next_id, "username": prof_username(d, p), "hashed_password": hashed, "role": "professeur",
+                "nom_complet": f"Professeur {d}-{p}", "email": f"{prof_username(d, p)}@fstt.ac.ma",
+                "departement_id": d, "chef_departement_id": None
+            })
+            prof_ids[d].append(next_id)
+            next_id += 1
+    with engine.begin() as conn:
+        conn.execute(insert(models.Departement), dept_rows)
+        conn.execute(insert(models.User), user_rows)
+    timings["users_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    now = datetime.utcnow()
+    statuts = [s for s, _ in STATUT_WEIGHTS]
+    weights = [w for _, w in STATUT_WEIGHTS]
+
+    def incident_rows():
+        for i in range(incidents):
+            d = rng.randint(1, departements)
+            created = now - timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600))
+            yield {
+                "type_inc": rng.choice(TYPES),
+                "salle": f"{rng.choice('ABCDE')}{rng.randint(1, 30)}",
+                "description": rng.choice(DESCRIPTIONS),
+                "statut": rng.choices(statuts, weights)[0],
+                "date_creation": created,
+                "date_modification": created,
+                "prof_id": rng.choice(prof_ids[d]),
+                "departement_id": d,
+            }
+
+    for batch in _batches(incident_rows(), batch_size):
+        # Une transaction par lot : la mémoire reste bornée quel que soit le volume
+        with engine.begin() as conn:
+            conn.execute(insert(models.Incident), batch)
+    timings["incidents_seconds"] = round(time.perf_counter() - start, 3)
+
+    # Index plein texte et compteurs construits une seule fois, après le chargement
+    start = time.perf_counter()
+    search.ensure_index(engine)
+    with Session(engine) as db:
+        counters.rebuild(db)
+    timings["indexes_seconds"] = round(time.perf_counter() - start, 3)
+    engine.dispose()
+
+    return {
+        "url": url,
+        "departements": departements,
+        "users": len(user_rows),
+        "incidents": incidents,
+        **timings,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une base de données synthétique")
+    parser.add_argument("--url", default="sqlite:///bench.db")
+    parser.add_argument("--departements", type=int, default=4)
+    parser.add_argument("--profs", type=int, default=20, help="professeurs par département")
+    parser.add_argument("--incidents", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(seed(args.url, args.departements, args.profs, args.incidents, args.batch, args.seed), indent=2))
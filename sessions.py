@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("incidents.sessions")
+
+# Durée de vie d'une session (24h, identique au max_age du cookie)
+SESSION_TTL = 24 * 3600
+SWEEP_INTERVAL = 60
+
+# Champs de l'utilisateur gardés dans la session pour éviter de relire la table users à chaque requête
+PRINCIPAL_FIELDS = ("role", "departement_id", "chef_departement_id", "nom_complet")
+
+def principal_from_user(user) -> dict:
+    return {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+
+class SessionBackend:
+    """Interface commune des stockages de sessions"""
+    def create(self, user_id: int, principal: dict) -> str:
+        raise NotImplementedError
+
+    def get(self, token: str):
+        """Retourne les données de la session, ou None si absente ou expirée"""
+        raise NotImplementedError
+
+    def set_page_token(self, token: str, page_token: str):
+        raise NotImplementedError
+
+    def delete(self, token: str):
+        raise NotImplementedError
+
+    def delete_user(self, user_id: int) -> list:
+        """Supprime toutes les sessions d'un utilisateur et retourne leurs jetons"""
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Supprime les sessions expirées et retourne leur nombre"""
+        raise NotImplementedError
+
+class MemorySessionBackend(SessionBackend):
+    """Sessions en mémoire du processus (un seul worker uvicorn).
+
+    La durée de vie étant fixe, l'ordre d'insertion est aussi l'ordre
+    d'expiration : l'OrderedDict permet au balayeur de ne parcourir que
+    les sessions réellement expirées, en tête de dictionnaire.
+    """
+    def __init__(self, ttl: int = SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, principal: dict) -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with self._lock:
+            self._sessions[token] = {
+                "user_id": user_id,
+                "principal": dict(principal),
+                "created_at": now,
+                "expires_at": now + self.ttl,
+                "page_token": None
+            }
+        return token
+
+    def get(self, token: str):
+        session_data = self._sessions.get(token)
+        if session_data is None or session_data["expires_at"] <= time.time():
+            return None
+        return session_data
+
+    def set_page_token(self, token: str, page_token: str):
+        session_data = self._sessions.get(token)
+        if session_data is not None:
+            session_data["page_token"] = page_token
+
+    def delete(self, token: str):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def delete_user(self, user_id: int) -> list:
+        # Parcours complet : appelé seulement quand un rôle ou un département change
+        with self._lock:
+            tokens = [token for token, data in self._sessions.items() if data["user_id"] == user_id]
+            for token in tokens:
+                del self._sessions[token]
+        return tokens
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                token, session_data = next(iter(self._sessions.items()))
+                if session_data["expires_at"] > now:
+                    break
+                del self._sessions[token]
+                removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions partagées entre plusieurs workers via un fichier SQLite local (mode WAL).
+
+    Le fichier et la table sont créés à la première utilisation, pas à
+    l'import de l'application.
+    """
+    def __init__(self, path: str, ttl: int = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    self._create_schema(conn)
+                    self._ready = True
+        return conn
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token TEXT PRIMARY KEY,"
+            " user_id INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " page_token TEXT,"
+            " principal TEXT)"
+        )
+        # Fichier créé par une version précédente : les anciennes sessions, sans principal, seront refusées
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "principal" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN principal TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_user_id ON sessions (user_id)")
+
+    def create(self, user_id: int, principal: dict) -> str:
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO sessions (token, user_id, created_at, expires_at, principal) VALUES (?, ?, ?, ?, ?)",
+            (token, user_id, now, now + self.ttl, json.dumps(principal))
+        )
+        return token
+
+    def get(self, token: str):
+        row = self._conn().execute(
+            "SELECT user_id, created_at, expires_at, page_token, principal FROM sessions"
+            " WHERE token = ? AND expires_at > ?",
+            (token, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "user_id": row[0], "created_at": row[1], "expires_at": row[2], "page_token": row[3],
+            "principal": json.loads(row[4]) if row[4] else None
+        }
+
+    def set_page_token(self, token: str, page_token: str):
+        self._conn().execute("UPDATE sessions SET page_token = ? WHERE token = ?", (page_token, token))
+
+    def delete(self, token: str):
+        self._conn().execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def delete_user(self, user_id: int) -> list:
+        conn = self._conn()
+        tokens = [row[0] for row in conn.execute("SELECT token FROM sessions WHERE user_id = ?", (user_id,))]
+        conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        return tokens
+
+    def sweep(self) -> int:
+        cursor = self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+class SessionSweeper:
+    """Thread de fond qui purge périodiquement les sessions expirées"""
+    def __init__(self, backend: SessionBackend, interval: float = SWEEP_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.backend.sweep()
+            except Exception:
+                logger.exception("Erreur de purge des sessions")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def get_backend() -> SessionBackend:
+    """Choisit le stockage selon SESSION_BACKEND ('memory' par défaut, ou 'sqlite')"""
+    kind = os.environ.get("SESSION_BACKEND", "memory")
+    if kind == "sqlite":
+        return SQLiteSessionBackend(os.environ.get("SESSION_DB_PATH", "sessions.db"))
+    if kind == "memory":
+        return MemorySessionBackend()
+    raise ValueError(f"SESSION_BACKEND inconnu: {kind}")
+
+_shared_backend = None
+_shared_lock = threading.Lock()
+# Appelés avec le jeton de chaque session fermée par invalidate_user (ex: événement SSE de main.py)
+invalidation_hooks = []
+
+def shared_backend() -> SessionBackend:
+    """Stockage des sessions du processus, créé au premier appel (application ou manage.py)"""
+    global _shared_backend
+    if _shared_backend is None:
+        with _shared_lock:
+            if _shared_backend is None:
+                _shared_backend = get_backend()
+    return _shared_backend
+
+def invalidate_user(user_id: int) -> list:
+    """Ferme toutes les sessions d'un utilisateur et retourne leurs jetons.
+
+    À appeler après tout changement de droits fait hors de l'ORM (UPDATE en
+    masse, SQL direct) ; les modifications par l'ORM passent par
+    watch_principal_changes. Avec SESSION_BACKEND=memory, seul le processus
+    courant est concerné.
+    """
+    tokens = shared_backend().delete_user(user_id)
+    for token in tokens:
+        for hook in invalidation_hooks:
+            hook(token)
+    return tokens
+
+def watch_principal_changes(user_class):
+    """Invalide les sessions d'un utilisateur modifié (champs de PRINCIPAL_FIELDS) ou supprimé par l'ORM"""
+    from sqlalchemy import event, inspect
+
+    def principal_changed(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS):
+            invalidate_user(target.id)
+
+    def user_deleted(mapper, connection, target):
+        invalidate_user(target.id)
+
+    event.listen(user_class, "after_update", principal_changed)
+    event.listen(user_class, "after_delete", user_deleted)
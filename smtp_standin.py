@@ -0,0 +1,77 @@
+"""Serveur SMTP minimal pour le développement : enregistre chaque message reçu.
+
+Aucun message n'est relayé ; chaque e-mail est écrit dans
+`<dossier>/<horodatage>-<n>.eml`.
+
+Usage :
+    python smtp_standin.py [--host localhost] [--port 1025] [--dossier mail_outbox]
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from pathlib import Path
+
+class SMTPStandin:
+    def __init__(self, outbox: Path):
+        self.outbox = Path(outbox)
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        self._sequence = itertools.count(1)
+
+    def _save(self, data: bytes) -> Path:
+        path = self.outbox / f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._sequence)}.eml"
+        path.write_bytes(data)
+        return path
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 smtp_standin prêt")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    await reply("250 smtp_standin")
+                elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 Fin des données par <CRLF>.<CRLF>")
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line in (b".\r\n", b".\n"):
+                            break
+                        # Point doublé en début de ligne (RFC 5321, 4.5.2)
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    path = self._save(b"".join(lines))
+                    await reply(f"250 Enregistré dans {path.name}")
+                elif command == "QUIT":
+                    await reply("221 Au revoir")
+                    break
+                else:
+                    await reply("502 Commande non prise en charge")
+        finally:
+            writer.close()
+
+async def serve(host: str, port: int, outbox: Path):
+    standin = SMTPStandin(outbox)
+    server = await asyncio.start_server(standin.handle, host, port)
+    print(f"SMTP de développement sur {host}:{port}, messages dans {standin.outbox}/")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur SMTP de développement")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--dossier", default="mail_outbox")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, Path(args.dossier)))
+    except KeyboardInterrupt:
+        pass
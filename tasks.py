@@ -0,0 +1,62 @@
+"""Traitements des tâches d'arrière-plan (voir jobs.py).
+
+- notifier_chef : e-mail récapitulatif au chef de département ; les
+  signalements d'une fenêtre de NOTIFY_WINDOW secondes sont regroupés en
+  un seul message ;
+- miniatures : vignette et aperçu d'une photo (thumbnails.py) ;
+- audit : journal JSON des changements de statut.
+"""
+import json
+import logging
+import os
+from sqlalchemy import select
+import database
+import jobs
+import mailer
+import models
+import thumbnails
+import uploads
+
+NOTIFY_WINDOW = int(os.environ.get("NOTIFY_WINDOW", "120"))
+
+audit_logger = logging.getLogger("incidents.audit")
+# Pool de processus de génération des dérivés, partagé avec les filtres Jinja de main.py
+image_pipeline = thumbnails.ThumbnailPipeline(uploads.UPLOAD_DIR)
+
+def enqueue_chef_notification(db, incident: models.Incident):
+    """Planifie l'e-mail au chef ; regroupé avec les autres signalements du département"""
+    jobs.enqueue(db, "notifier_chef", {
+        "departement_id": incident.departement_id,
+        "incident_id": incident.id,
+        "type_inc": incident.type_inc,
+        "salle": incident.salle,
+    }, delay=NOTIFY_WINDOW, coalesce_key=f"notifier_chef:{incident.departement_id}")
+
+@jobs.register("notifier_chef", concurrency=2, max_attempts=8)
+def notify_chef(payloads):
+    departement_id = payloads[0]["departement_id"]
+    with database.SessionLocal() as db:
+        chef = db.execute(
+            select(models.User.email, models.User.nom_complet)
+            .where(models.User.role == "chef", models.User.chef_departement_id == departement_id)
+        ).first()
+    if chef is None or not chef.email:
+        return
+    lines = [f"- {p['type_inc']} en salle {p['salle']} (incident n°{p['incident_id']})" for p in payloads]
+    subject = "Nouveau signalement" if len(payloads) == 1 else f"{len(payloads)} nouveaux signalements"
+    mailer.send(chef.email, subject, f"Bonjour {chef.nom_complet},\n\n" + "\n".join(lines) + "\n")
+
+@jobs.register("miniatures", concurrency=thumbnails.IMAGE_WORKERS, max_attempts=3)
+def make_thumbnails(payloads):
+    for payload in payloads:
+        source = uploads.local_path(uploads.UPLOAD_DIR, payload["image_path"])
+        if all(path.exists() for path in thumbnails.derived_paths(source)):
+            # Photo identique déjà envoyée : mêmes dérivés
+            continue
+        # Le calcul reste dans le pool de processus ; une erreur remonte et déclenche un nouvel essai
+        image_pipeline.schedule(payload["image_path"]).result()
+
+@jobs.register("audit")
+def audit(payloads):
+    for payload in payloads:
+        audit_logger.info(json.dumps(payload, ensure_ascii=False, default=str))
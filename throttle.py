@@ -0,0 +1,201 @@
+"""Limitation des tentatives de connexion par seau à jetons (token bucket).
+
+Deux seaux sont consultés avant toute vérification bcrypt : un par nom
+d'utilisateur (devinettes sur un compte) et un par adresse IP (balayage
+de nombreux comptes). Un refus ne coûte qu'une lecture de dictionnaire.
+Le stockage en mémoire vaut pour un seul worker ; THROTTLE_BACKEND=sqlite
+partage les seaux entre workers via un fichier local, comme les sessions.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+logger = logging.getLogger("incidents.throttle")
+
+# Capacité (rafale autorisée) et rythme de recharge (jetons par minute) de chaque seau
+LOGIN_USERNAME_BURST = int(os.environ.get("LOGIN_USERNAME_BURST", "5"))
+LOGIN_USERNAME_PER_MINUTE = float(os.environ.get("LOGIN_USERNAME_PER_MINUTE", "5"))
+LOGIN_IP_BURST = int(os.environ.get("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.environ.get("LOGIN_IP_PER_MINUTE", "30"))
+LOGIN_THROTTLE_ENABLED = os.environ.get("LOGIN_THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Derrière un proxy de confiance, l'adresse du client est la première de X-Forwarded-For
+TRUST_FORWARDED_FOR = os.environ.get("TRUST_FORWARDED_FOR", "false").lower() in ("1", "true", "yes")
+# Nombre maximal de seaux gardés en mémoire (les plus anciens sont oubliés)
+MAX_BUCKETS = int(os.environ.get("THROTTLE_MAX_BUCKETS", "100000"))
+# Purge des seaux inutilisés du stockage SQLite : fréquence et ancienneté (secondes)
+THROTTLE_SWEEP_INTERVAL = float(os.environ.get("THROTTLE_SWEEP_INTERVAL", "300"))
+THROTTLE_SWEEP_MAX_AGE = float(os.environ.get("THROTTLE_SWEEP_MAX_AGE", "3600"))
+
+login_throttled = metrics.registry.register(metrics.Counter(
+    "login_throttled_total", "Tentatives de connexion refusées par le limiteur, par seau"
+))
+
+class LoginThrottled(Exception):
+    """Levée quand un seau est vide ; `retry_after` est le délai avant le prochain jeton"""
+    def __init__(self, retry_after: float):
+        super().__init__("Trop de tentatives de connexion")
+        self.retry_after = retry_after
+
+def client_ip(request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "inconnu"
+
+def _refill(tokens: float, updated_at: float, now: float, capacity: int, per_second: float) -> float:
+    return min(capacity, tokens + (now - updated_at) * per_second)
+
+class ThrottleBackend:
+    """Interface commune des stockages de seaux"""
+    def consume(self, key: str, capacity: int, per_second: float) -> float:
+        """Prend un jeton ; retourne 0 si accordé, sinon le délai en secondes avant le prochain jeton"""
+        raise NotImplementedError
+
+    def sweep(self, max_age: float = THROTTLE_SWEEP_MAX_AGE) -> int:
+        """Oublie les seaux inutilisés ; rien à faire pour un stockage déjà borné"""
+        return 0
+
+class MemoryThrottleBackend(ThrottleBackend):
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: int, per_second: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, per_second)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / per_second
+            self._buckets[key] = (tokens, now)
+            # Un balayage d'adresses ne doit pas faire grossir la mémoire sans limite
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+class SQLiteThrottleBackend(ThrottleBackend):
+    """Seaux partagés entre plusieurs workers via un fichier SQLite local (mode WAL).
+
+    Le fichier et la table sont créés à la première tentative de connexion,
+    pas à l'import de l'application.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            with self._ready_lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS throttle_buckets ("
+                        " key TEXT PRIMARY KEY,"
+                        " tokens REAL NOT NULL,"
+                        " updated_at REAL NOT NULL)"
+                    )
+                    self._ready = True
+        return conn
+
+    def consume(self, key: str, capacity: int, per_second: float) -> float:
+        # Horloge murale : partagée entre les processus, contrairement à monotonic()
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM throttle_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, per_second)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / per_second
+            conn.execute(
+                "INSERT INTO throttle_buckets (key, tokens, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def sweep(self, max_age: float = THROTTLE_SWEEP_MAX_AGE) -> int:
+        """Supprime les seaux inutilisés depuis `max_age` secondes (forcément pleins)"""
+        cursor = self._conn().execute("DELETE FROM throttle_buckets WHERE updated_at < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+class ThrottleSweeper:
+    """Thread de fond qui purge périodiquement les seaux inutilisés"""
+    def __init__(self, backend: ThrottleBackend, interval: float = THROTTLE_SWEEP_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.backend.sweep()
+            except Exception:
+                logger.exception("Erreur de purge des seaux de connexion")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="throttle-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+class LoginThrottle:
+    """Applique les seaux par nom d'utilisateur et par IP à une tentative de connexion"""
+    def __init__(self, backend: ThrottleBackend, enabled: bool = LOGIN_THROTTLE_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+
+    def check(self, username: str, client_ip: str) -> float:
+        """Retourne 0 si la tentative peut être vérifiée, sinon le délai (Retry-After) en secondes"""
+        if not self.enabled:
+            return 0.0
+        # IP d'abord : un balayage de comptes depuis une même adresse ne consomme pas les seaux des comptes
+        retry_after = self.backend.consume(f"ip:{client_ip}", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+        if retry_after:
+            login_throttled.inc(bucket="ip")
+            return retry_after
+        retry_after = self.backend.consume(
+            f"user:{username.strip().lower()}", LOGIN_USERNAME_BURST, LOGIN_USERNAME_PER_MINUTE / 60
+        )
+        if retry_after:
+            login_throttled.inc(bucket="username")
+        return retry_after
+
+def get_backend() -> ThrottleBackend:
+    """Choisit le stockage selon THROTTLE_BACKEND ('memory' par défaut, ou 'sqlite')"""
+    kind = os.environ.get("THROTTLE_BACKEND", "memory")
+    if kind == "sqlite":
+        return SQLiteThrottleBackend(os.environ.get("THROTTLE_DB_PATH", "throttle.db"))
+    if kind == "memory":
+        return MemoryThrottleBackend()
+    raise ValueError(f"THROTTLE_BACKEND inconnu: {kind}")
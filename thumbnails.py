@@ -0,0 +1,120 @@
+"""Génération en arrière-plan des vignettes et aperçus des photos d'incidents.
+
+Pour chaque photo `uploads/ab/cd/<sha256>.<ext>`, deux dérivés sont
+produits dans le sous-dossier `derived/` voisin : une vignette JPEG pour
+les tableaux et un aperçu WebP (ou JPEG si Pillow n'a pas le support
+WebP) de taille plafonnée pour la fenêtre modale. Tant qu'un dérivé n'existe pas, les filtres Jinja
+renvoient l'image d'origine.
+"""
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image, ImageOps, features
+from uploads import local_path
+
+logger = logging.getLogger("incidents.thumbnails")
+
+THUMBNAIL_SIZE = (180, 180)
+PREVIEW_SIZE = (1600, 1600)
+PREVIEW_MAX_BYTES = 400 * 1024
+PREVIEW_QUALITIES = (80, 70, 60, 50, 40)
+PREVIEW_FORMAT, PREVIEW_EXT = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+
+def derived_paths(source: Path):
+    """Chemins de la vignette et de l'aperçu d'une photo"""
+    derived_dir = source.parent / "derived"
+    return derived_dir / f"{source.stem}_thumb.jpg", derived_dir / f"{source.stem}_preview.{PREVIEW_EXT}"
+
+def _save_atomic(image, path: Path, **params):
+    # Écrire puis renommer : les pages ne voient jamais un fichier à moitié écrit
+    partial = path.with_name(path.name + ".part")
+    image.save(partial, **params)
+    os.replace(partial, path)
+
+def _to_rgb(image):
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+def generate_derivatives(source: str):
+    """Crée la vignette et l'aperçu d'une photo (exécuté dans un processus du pool)"""
+    source = Path(source)
+    thumb_path, preview_path = derived_paths(source)
+    thumb_path.parent.mkdir(exist_ok=True)
+
+    with Image.open(source) as original:
+        image = _to_rgb(ImageOps.exif_transpose(original))
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    _save_atomic(thumbnail, thumb_path, format="JPEG", quality=80, optimize=True)
+
+    preview = image.copy()
+    preview.thumbnail(PREVIEW_SIZE)
+    # Baisser la qualité jusqu'à passer sous le plafond de taille
+    for quality in PREVIEW_QUALITIES:
+        _save_atomic(preview, preview_path, format=PREVIEW_FORMAT, quality=quality)
+        if preview_path.stat().st_size <= PREVIEW_MAX_BYTES:
+            break
+    return str(thumb_path), str(preview_path)
+
+class ThumbnailPipeline:
+    """Pool de processus qui génère les dérivés sans retarder la réponse HTTP"""
+    def __init__(self, upload_dir: Path, workers: int = IMAGE_WORKERS):
+        self.upload_dir = Path(upload_dir)
+        self.workers = workers
+        self._executor = None
+
+    def _source_path(self, image_path: str) -> Path:
+        return local_path(self.upload_dir, image_path)
+
+    def schedule(self, image_path: str):
+        """Planifie la génération des dérivés d'une image publiée sous /uploads/..."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        future = self._executor.submit(generate_derivatives, str(self._source_path(image_path)))
+        future.add_done_callback(self._report_error)
+        return future
+
+    @staticmethod
+    def _report_error(future):
+        if not future.cancelled() and future.exception():
+            logger.error("Erreur de génération des miniatures: %s", future.exception())
+
+    def _derived_url(self, image_path: str, index: int) -> str:
+        if not image_path:
+            return image_path
+        derived = derived_paths(self._source_path(image_path))[index]
+        if derived.exists():
+            return f"/uploads/{derived.relative_to(self.upload_dir).as_posix()}"
+        return image_path
+
+    def thumbnail_url(self, image_path: str) -> str:
+        """Filtre Jinja : URL de la vignette, ou de l'original si elle n'existe pas encore"""
+        return self._derived_url(image_path, 0)
+
+    def preview_url(self, image_path: str) -> str:
+        """Filtre Jinja : URL de l'aperçu, ou de l'original s'il n'existe pas encore"""
+        return self._derived_url(image_path, 1)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+if __name__ == "__main__":
+    # Rattrapage des photos existantes : python thumbnails.py [dossier_uploads]
+    upload_dir = Path(sys.argv[1] if len(sys.argv) > 1 else "uploads")
+    for source in sorted(upload_dir.glob("??/??/*")):
+        if source.is_file():
+            try:
+                print(generate_derivatives(str(source)))
+            except Exception as e:
+                print(f"❌ {source.name}: {e}")
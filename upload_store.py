@@ -0,0 +1,339 @@
+"""Références des photos stockées par contenu et ramasse-miettes des orphelines.
+
+Les photos sont écrites par uploads.save_upload_file sous
+`uploads/ab/cd/<sha256>.<ext>` : deux envois identiques partagent le même
+fichier. La table `fichiers` compte les incidents (actifs et archivés) qui
+référencent chaque fichier :
+- `add_reference` l'incrémente dans la transaction qui crée l'incident ;
+- `recount` le recalcule depuis `incidents` et `incidents_archive`, par
+  lots de fichiers et en courtes transactions, ce qui rattrape les
+  suppressions faites hors de l'application (ex: reset_users dans test.py) ;
+- `collect` supprime les fichiers sans référence depuis UPLOAD_GC_GRACE
+  secondes, après une dernière vérification dans les tables d'incidents.
+
+Le délai de grâce couvre l'intervalle entre l'écriture du fichier et le
+commit de l'incident. Avant suppression, le fichier est renommé : un envoi
+identique qui le rajeunit juste avant est détecté (le fichier est remis en
+place), et un envoi juste après ne le trouve plus et l'écrit à nouveau.
+
+Le ramasse-miettes tourne dans un seul processus, planifié par exemple
+chaque heure via cron (UPLOAD_GC_IN_APP=true le lance plutôt dans
+l'application, pour un déploiement à un seul worker) :
+    python upload_store.py gc [--complet]
+    python upload_store.py migrer     déplace les anciens uploads/<uuid>.<ext> (une seule fois)
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import delete, func, select, union, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import models
+from thumbnails import derived_paths
+from uploads import CHUNK_SIZE, UPLOAD_DIR, detect_image_type, local_path, shard_path
+
+logger = logging.getLogger("incidents.upload_store")
+
+UPLOAD_GC_INTERVAL = float(os.environ.get("UPLOAD_GC_INTERVAL", "3600"))
+UPLOAD_GC_GRACE = int(os.environ.get("UPLOAD_GC_GRACE", "3600"))
+UPLOAD_GC_BATCH = int(os.environ.get("UPLOAD_GC_BATCH", "500"))
+
+def _upsert(dialect_name: str, chemin: str, delta: int):
+    values = {"chemin": chemin, "nb_references": delta, "date_creation": datetime.utcnow()}
+    if dialect_name == "mysql":
+        stmt = mysql_insert(models.Fichier).values(**values)
+        return stmt.on_duplicate_key_update(nb_references=models.Fichier.nb_references + delta, date_liberation=None)
+    stmt = sqlite_insert(models.Fichier).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=["chemin"],
+        set_={"nb_references": models.Fichier.nb_references + delta, "date_liberation": None}
+    )
+
+async def add_reference(db, image_path: str):
+    """Compte une référence de plus à la photo, dans la transaction en cours de `db`"""
+    await db.execute(_upsert(db.get_bind().dialect.name, image_path, 1))
+
+def _referenced(conn, paths) -> set:
+    return set(conn.execute(union(*(
+        select(model.image_path).where(model.image_path.in_(paths))
+        for model in (models.Incident, models.IncidentArchive)
+    ))).scalars())
+
+def recount(engine, batch_size: int = UPLOAD_GC_BATCH) -> int:
+    """Recalcule les références des fichiers, par lots de `batch_size` ; retourne le nombre de lignes corrigées"""
+    fichiers = models.Fichier.__table__
+    corrected = 0
+    last = ""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(fichiers.c.chemin, fichiers.c.nb_references, fichiers.c.date_liberation)
+                .where(fichiers.c.chemin > last).order_by(fichiers.c.chemin).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last = rows[-1].chemin
+            paths = [row.chemin for row in rows]
+            counts = Counter()
+            for model in (models.Incident, models.IncidentArchive):
+                for image_path, count in conn.execute(
+                    select(model.image_path, func.count()).where(model.image_path.in_(paths)).group_by(model.image_path)
+                ):
+                    counts[image_path] += count
+            now = datetime.utcnow()
+            for row in rows:
+                count = counts[row.chemin]
+                freed = count == 0
+                if count == row.nb_references and freed == (row.date_liberation is not None):
+                    continue
+                values = {"nb_references": count}
+                if not freed:
+                    values["date_liberation"] = None
+                elif row.date_liberation is None:
+                    values["date_liberation"] = now
+                # Seules les lignes corrigées sont écrites, et pas si add_reference vient de les modifier
+                result = conn.execute(update(fichiers).where(
+                    fichiers.c.chemin == row.chemin, fichiers.c.nb_references == row.nb_references
+                ).values(**values))
+                corrected += result.rowcount
+    return corrected
+
+def _tombstone(source: Path) -> Path:
+    return source.with_name(source.name + ".supprime")
+
+def _retire(source: Path, mtime_cutoff: float):
+    """Écarte le fichier avant sa suppression ; retourne son nouveau chemin, None s'il faut le garder.
+
+    S'il a été rajeuni par un envoi identique (uploads.save_upload_file),
+    l'incident n'est peut-être pas encore enregistré : il est remis en place.
+    """
+    tombstone = _tombstone(source)
+    try:
+        os.replace(source, tombstone)
+    except FileNotFoundError:
+        return tombstone
+    if tombstone.stat().st_mtime >= mtime_cutoff:
+        os.replace(tombstone, source)
+        return None
+    return tombstone
+
+def _restore(source: Path):
+    try:
+        os.replace(_tombstone(source), source)
+    except FileNotFoundError:
+        pass
+
+def _remove(source: Path) -> int:
+    """Supprime la photo écartée et ses dérivés ; retourne le nombre d'octets libérés"""
+    freed = 0
+    for path in (_tombstone(source), source, *derived_paths(source)):
+        if path == source:
+            # Réécrit par un envoi concurrent après l'écartement : le nouveau fichier est gardé
+            continue
+        try:
+            freed += path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    return freed
+
+def collect(engine, upload_dir: Path = UPLOAD_DIR, grace: int = UPLOAD_GC_GRACE,
+            batch_size: int = UPLOAD_GC_BATCH) -> dict:
+    """Supprime les fichiers sans référence depuis plus de `grace` secondes"""
+    fichiers = models.Fichier.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    mtime_cutoff = time.time() - grace
+    removed = freed = 0
+    while True:
+        with engine.begin() as conn:
+            paths = conn.execute(
+                select(fichiers.c.chemin)
+                .where(fichiers.c.nb_references == 0, fichiers.c.date_liberation < cutoff)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not paths:
+                break
+            # Dernière vérification : le compteur peut avoir pris du retard sur les incidents
+            referenced = _referenced(conn, paths)
+            if referenced:
+                conn.execute(update(fichiers).where(fichiers.c.chemin.in_(referenced)).values(date_liberation=None))
+            orphans = []
+            try:
+                for image_path in paths:
+                    if image_path in referenced:
+                        continue
+                    source = local_path(upload_dir, image_path)
+                    if _retire(source, mtime_cutoff) is None:
+                        conn.execute(update(fichiers).where(fichiers.c.chemin == image_path).values(date_liberation=datetime.utcnow()))
+                        continue
+                    # Compteur revérifié dans la transaction : add_reference a pu passer entre-temps
+                    result = conn.execute(delete(fichiers).where(
+                        fichiers.c.chemin == image_path, fichiers.c.nb_references == 0
+                    ))
+                    if result.rowcount != 1:
+                        _restore(source)
+                        continue
+                    orphans.append(source)
+            except BaseException:
+                for source in orphans:
+                    _restore(source)
+                raise
+        # Après le commit : une interruption laisse au pire un fichier écarté sans ligne, repris par full_scan
+        for source in orphans:
+            freed += _remove(source)
+        removed += len(orphans)
+    return {"supprimes": removed, "octets_liberes": freed}
+
+def full_scan(engine, upload_dir: Path = UPLOAD_DIR, grace: int = UPLOAD_GC_GRACE,
+              batch_size: int = UPLOAD_GC_BATCH) -> dict:
+    """Parcourt le disque et supprime les fichiers inconnus de la table `fichiers` et non référencés.
+
+    Rattrape les photos écrites par une requête qui a échoué avant son
+    commit ; plus coûteux que `collect`, à lancer occasionnellement.
+    """
+    mtime_cutoff = time.time() - grace
+    removed = freed = 0
+
+    def check(batch):
+        nonlocal removed, freed
+        with engine.connect() as conn:
+            known = set(conn.execute(
+                select(models.Fichier.chemin).where(models.Fichier.chemin.in_(batch))
+            ).scalars()) | _referenced(conn, batch)
+        for image_path in batch:
+            source = local_path(upload_dir, image_path)
+            if image_path not in known and _retire(source, mtime_cutoff) is not None:
+                freed += _remove(source)
+                removed += 1
+
+    batch = []
+    for path in Path(upload_dir).glob("??/??/*"):
+        if path.is_file():
+            # Fichier écarté par une suppression interrompue : traité sous son nom d'origine
+            if path.suffix == ".supprime":
+                path = path.with_suffix("")
+            batch.append(f"/uploads/{path.relative_to(upload_dir).as_posix()}")
+            if len(batch) == batch_size:
+                check(batch)
+                batch = []
+    if batch:
+        check(batch)
+    return {"supprimes": removed, "octets_liberes": freed}
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def migrate_legacy(engine, upload_dir: Path = UPLOAD_DIR) -> dict:
+    """Déplace les photos de l'ancien format plat (uploads/<uuid>.<ext>) vers le stockage par contenu.
+
+    Pour chaque fichier : copie (lien physique si possible) sous son
+    empreinte, mise à jour des incidents qui le référencent, puis
+    suppression de l'ancien fichier. Relancer la commande reprend là où
+    elle s'était arrêtée.
+    """
+    upload_dir = Path(upload_dir)
+    stats = {"fichiers": 0, "doublons": 0, "octets_economises": 0, "ignores": 0}
+    for old in sorted(upload_dir.iterdir()):
+        if not old.is_file() or old.name.startswith(".") or old.suffix == ".part":
+            continue
+        with open(old, "rb") as f:
+            extension = detect_image_type(f.read(16))
+        if extension is None:
+            stats["ignores"] += 1
+            continue
+        old_path = f"/uploads/{old.name}"
+        new_path = f"/uploads/{shard_path(_file_digest(old), extension)}"
+        new = local_path(upload_dir, new_path)
+        if new.exists():
+            stats["doublons"] += 1
+            stats["octets_economises"] += old.stat().st_size
+        else:
+            new.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(old, new)
+            except OSError:
+                shutil.copy2(old, new)
+            # Les dérivés déjà générés suivent la photo
+            for old_derived, new_derived in zip(derived_paths(old), derived_paths(new)):
+                if old_derived.exists():
+                    new_derived.parent.mkdir(exist_ok=True)
+                    os.replace(old_derived, new_derived)
+
+        with engine.begin() as conn:
+            for model in (models.Incident, models.IncidentArchive):
+                conn.execute(update(model).where(model.image_path == old_path).values(image_path=new_path))
+            conn.execute(_upsert(conn.dialect.name, new_path, 0))
+        for path in (old, *derived_paths(old)):
+            path.unlink(missing_ok=True)
+        stats["fichiers"] += 1
+
+    recount(engine)
+    return stats
+
+class UploadSweeper:
+    """Thread de fond qui recompte les références et supprime périodiquement les photos orphelines"""
+    def __init__(self, engine, upload_dir: Path = UPLOAD_DIR, interval: float = UPLOAD_GC_INTERVAL):
+        self.engine = engine
+        self.upload_dir = upload_dir
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> dict:
+        recount(self.engine)
+        return collect(self.engine, self.upload_dir)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Erreur du ramasse-miettes des photos")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="upload-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stockage des photos d'incidents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrer", help="déplacer les photos de l'ancien format vers le stockage par contenu")
+    gc_parser = subparsers.add_parser("gc", help="supprimer les photos orphelines")
+    gc_parser.add_argument("--complet", action="store_true", help="parcourir aussi le disque (fichiers sans ligne en base)")
+    gc_parser.add_argument("--grace", type=int, default=UPLOAD_GC_GRACE, help="ancienneté minimale des orphelines (secondes)")
+    parser.add_argument("--dossier", default=str(UPLOAD_DIR))
+    args = parser.parse_args()
+
+    import database
+    import metrics
+    metrics.configure_logging()
+    upload_dir = Path(args.dossier)
+    if args.command == "migrer":
+        result = migrate_legacy(database.engine, upload_dir)
+    else:
+        result = {"recomptes": recount(database.engine)}
+        result.update(collect(database.engine, upload_dir, args.grace))
+        if args.complet:
+            result["disque"] = full_scan(database.engine, upload_dir, args.grace)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
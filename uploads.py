@@ -0,0 +1,125 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+# Dossier des photos publiées sous /uploads/
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "uploads"))
+
+# Taille maximale d'une photo (cf. "Max 5MB" dans prof.html) et taille des blocs d'écriture
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", str(5 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+# Marge pour les autres champs du formulaire et les en-têtes multipart
+FORM_OVERHEAD = 64 * 1024
+
+# Signatures (magic bytes) des formats d'image acceptés
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+def detect_image_type(header: bytes):
+    """Retourne l'extension correspondant aux premiers octets du fichier, ou None"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def shard_path(digest: str, extension: str) -> str:
+    """Chemin relatif d'une photo nommée par son contenu : ab/cd/<sha256>.<ext>"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+def local_path(upload_dir: Path, image_path: str) -> Path:
+    """Fichier correspondant à un chemin public /uploads/..."""
+    return Path(upload_dir) / image_path.removeprefix("/uploads/")
+
+async def save_upload_file(upload_file: UploadFile, upload_dir: Path) -> str:
+    """Écrit le fichier uploadé par blocs sans bloquer la boucle et retourne son chemin public.
+
+    Le type est déduit du contenu et non de l'extension fournie par le
+    client ; la taille est vérifiée au fil de l'écriture. Le fichier est
+    nommé par l'empreinte SHA-256 de son contenu dans des sous-dossiers
+    ab/cd/ : une photo déjà stockée n'est pas écrite une seconde fois.
+    """
+    if not upload_file:
+        return None
+
+    chunk = await upload_file.read(CHUNK_SIZE)
+    file_extension = detect_image_type(chunk)
+    if not file_extension:
+        raise HTTPException(status_code=415, detail="Format d'image non supporté (JPG, PNG, GIF, WEBP)")
+
+    partial_path = upload_dir / f"{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as buffer:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail="Image trop volumineuse")
+                digest.update(chunk)
+                await buffer.write(chunk)
+                chunk = await upload_file.read(CHUNK_SIZE)
+        relative_path = shard_path(digest.hexdigest(), file_extension)
+        file_path = upload_dir / relative_path
+        try:
+            # Doublon : garder la copie existante, rajeunie pour que le ramasse-miettes
+            # (upload_store.py) ne la supprime pas avant que l'incident soit enregistré
+            os.utime(file_path)
+            await aiofiles.os.remove(partial_path)
+        except FileNotFoundError:
+            # Absente, ou écartée à l'instant par le ramasse-miettes : écrire la nouvelle copie
+            await aiofiles.os.makedirs(file_path.parent, exist_ok=True)
+            await aiofiles.os.replace(partial_path, file_path)
+    except BaseException:
+        if partial_path.exists():
+            await aiofiles.os.remove(partial_path)
+        raise
+
+    return f"/uploads/{relative_path}"
+
+class UploadSizeLimitMiddleware:
+    """Refuse les corps de requête trop gros sur les routes d'upload, avant ou pendant la réception.
+
+    Le Content-Length annoncé est vérifié d'emblée ; les octets réellement
+    reçus sont ensuite comptés, et la lecture s'interrompt dès que la
+    limite est dépassée, sans attendre la fin du corps.
+    """
+    def __init__(self, app, path_prefix: str, max_body_size: int = MAX_UPLOAD_SIZE + FORM_OVERHEAD):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse({"detail": "Requête trop volumineuse"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(status_code=413, detail="Requête trop volumineuse")
+            return message
+
+        await self.app(scope, limited_receive, send)